@@ -0,0 +1,167 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import NamedTuple
+
+import numpy as np
+
+from agent.constants import TYPE_EFFECTIVENESS, Move, PokemonType
+from agent.memory_reader import PokemonData, PokemonRedReader
+
+logger = logging.getLogger(__name__)
+
+# TYPE_CHART[attacking type, defending type] -> damage multiplier, indexed by PokemonType values
+TYPE_CHART = np.ones((max(PokemonType) + 1, max(PokemonType) + 1), dtype=np.float32)
+for (attacking, defending), multiplier in TYPE_EFFECTIVENESS.items():
+    TYPE_CHART[attacking, defending] = multiplier
+
+# In Generation 1 the move type decides the stats used: FIRE and above are special
+FIRST_SPECIAL_TYPE = PokemonType.FIRE
+# Mean of the random damage roll (217-255 out of 255)
+AVERAGE_DAMAGE_ROLL = (217 + 255) / 2 / 255
+
+WILD_BATTLE = 1
+# Balls that can be thrown from the battle ITEM menu (the Safari Zone has its own menu)
+POKE_BALLS = ("POKé BALL", "GREAT BALL", "ULTRA BALL", "MASTER BALL")
+
+# Move data never changes (it is read from ROM), so decode each move once
+_move_data_cache = {}
+
+
+class MoveArrays(NamedTuple):
+    """Per-move data of one Pokemon as parallel arrays, in move slot order."""
+
+    power: np.ndarray
+    types: np.ndarray
+    accuracy: np.ndarray
+    pp: np.ndarray
+
+
+@dataclass
+class BattleState:
+    """The decoded state of the current battle."""
+
+    battle_type: int  # 1 = wild, 2 = trainer
+    player: PokemonData
+    enemy: PokemonData
+    player_moves: MoveArrays
+    enemy_moves: MoveArrays
+    enemy_owned: bool = True  # the enemy species is registered as owned in the Pokedex
+    poke_balls: int = 0  # Poke Balls of any kind in the bag
+
+
+@dataclass
+class BattleDecision:
+    """What the local battle policy wants to do next."""
+
+    action: str  # "fight", "run" or "escalate"
+    reason: str
+    move_slot: int | None = None  # 1-based, for "fight"
+
+
+def _move_arrays(reader, pokemon):
+    data = []
+    for name in pokemon.moves:
+        move_id = Move[name.replace(" ", "_")]
+        if move_id not in _move_data_cache:
+            _move_data_cache[move_id] = reader.read_move_data(move_id)
+        _, power, move_type, accuracy = _move_data_cache[move_id]
+        data.append((power, move_type, accuracy))
+    power, types, accuracy = (np.array(column, dtype=np.int32) for column in zip(*data)) if data else (
+        np.zeros(0, dtype=np.int32) for _ in range(3)
+    )
+    return MoveArrays(power, types, accuracy, np.array(pokemon.move_pp, dtype=np.int32))
+
+
+def read_battle_state(reader: PokemonRedReader) -> BattleState | None:
+    """Decode both Pokemon in battle and their moves, or return None outside of a battle."""
+    battle_type = reader.read_battle_type()
+    if battle_type not in (1, 2):
+        return None
+    player = reader.read_battle_pokemon()
+    enemy = reader.read_battle_pokemon(enemy=True)
+    if player is None or enemy is None:
+        return None
+    poke_balls = sum(quantity for name, quantity in reader.read_items() if name in POKE_BALLS)
+    return BattleState(
+        battle_type,
+        player,
+        enemy,
+        _move_arrays(reader, player),
+        _move_arrays(reader, enemy),
+        enemy_owned=reader.is_species_owned(enemy.species_id),
+        poke_balls=poke_balls,
+    )
+
+
+def type_effectiveness(move_types, defender):
+    """Damage multipliers of the given move types against a Pokemon."""
+    multiplier = TYPE_CHART[move_types, defender.type1]
+    if defender.type2 is not None:
+        multiplier = multiplier * TYPE_CHART[move_types, defender.type2]
+    return multiplier
+
+
+def expected_damage(attacker, defender, moves):
+    """
+    Estimate the expected damage of each move with the Generation 1 damage formula,
+    including STAB, type effectiveness, the average damage roll and accuracy.
+    Status moves and fixed-damage moves (power 0 or 1) count as 0.
+
+    Returns:
+        np.ndarray: Expected damage per move slot
+    """
+    special = moves.types >= FIRST_SPECIAL_TYPE
+    attack = np.where(special, attacker.special, attacker.attack)
+    defense = np.maximum(np.where(special, defender.special, defender.defense), 1)
+    base = (2 * attacker.level // 5 + 2) * moves.power * attack // defense // 50 + 2
+    stab = np.where(
+        (moves.types == attacker.type1) | (moves.types == (attacker.type2 or attacker.type1)), 1.5, 1.0
+    )
+    damage = base * stab * type_effectiveness(moves.types, defender) * AVERAGE_DAMAGE_ROLL * moves.accuracy / 255
+    return np.where(moves.power > 1, damage, 0.0)
+
+
+class BattlePolicy:
+    """
+    Local policy for trivial wild encounters.
+
+    Fights with the move that is expected to knock the enemy out fastest when
+    that takes at most `max_turns` turns without risking a faint, and runs when
+    the enemy cannot be beaten quickly. Trainer battles, low HP, enemies above
+    the player's level and species the player could catch (not owned yet, with
+    Poke Balls in the bag) are escalated to the model.
+    """
+
+    def __init__(self, low_hp=0.35, level_margin=0, max_turns=3):
+        self.low_hp = low_hp
+        self.level_margin = level_margin
+        self.max_turns = max_turns
+
+    def decide(self, state: BattleState) -> BattleDecision:
+        player, enemy = state.player, state.enemy
+        if state.battle_type != WILD_BATTLE:
+            return BattleDecision("escalate", "trainer battle")
+        if state.poke_balls and not state.enemy_owned:
+            return BattleDecision("escalate", f"wild {enemy.species_name} is not in the Pokedex yet and could be caught")
+        if player.current_hp < self.low_hp * player.max_hp:
+            return BattleDecision("escalate", f"{player.nickname} is low on HP ({player.current_hp}/{player.max_hp})")
+        if enemy.level > player.level + self.level_margin:
+            return BattleDecision("escalate", f"wild {enemy.species_name} (Lv{enemy.level}) is stronger than {player.nickname} (Lv{player.level})")
+
+        damage = np.where(state.player_moves.pp > 0, expected_damage(player, enemy, state.player_moves), 0.0)
+        if not damage.size or damage.max() <= 0:
+            return BattleDecision("run", "no damaging move available")
+        best = int(np.argmax(damage))
+        turns = math.ceil(enemy.current_hp / damage[best])
+        if turns > self.max_turns:
+            return BattleDecision("run", f"wild {enemy.species_name} would take about {turns} turns to defeat")
+
+        threat = expected_damage(enemy, player, state.enemy_moves).max(initial=0.0)
+        if threat * turns >= player.current_hp:
+            return BattleDecision("escalate", f"{player.nickname} could faint against wild {enemy.species_name}")
+        return BattleDecision(
+            "fight",
+            f"{player.moves[best]} should defeat wild {enemy.species_name} in about {turns} turn{'s' if turns > 1 else ''}",
+            best + 1,
+        )
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import time
+
+import numpy as np
+
+from agent.history import FrozenDict, has_image_ref
+from agent.screenshot_encoder import ScreenshotEncoder
+
+logger = logging.getLogger(__name__)
+
+PNG_DATA_URL_PREFIX = "data:image/png;base64,"
+
+
+def image_ref_part(key, width, height):
+    """Build a history content part that references an image in the BlobStore."""
+    return {"type": "image_ref", "image_ref": {"key": key, "width": width, "height": height}}
+
+
+class BlobStore:
+    """
+    Content-addressed store for the base64 screenshots referenced by the message history.
+
+    History messages only hold small `image_ref` parts; the image data is kept
+    once here (as a ready-made data URL) and inlined into the request when it is sent.
+    """
+
+    def __init__(self, timer=None, encoder=None):
+        """
+        Args:
+            timer: Optional StageTimer that records screenshot encoding as the "encode" stage
+            encoder: ScreenshotEncoder for put_screenshot (default: PNG)
+        """
+        self.timer = timer
+        self.encoder = encoder or ScreenshotEncoder()
+        self.blobs = {}
+        # key -> Future of the data URL, for screenshots still being encoded on a worker
+        self.pending = {}
+        # Keys kept by retain() even when no message references them
+        self.pinned = set()
+
+    def __len__(self):
+        return len(self.blobs)
+
+    @property
+    def size_bytes(self):
+        """Total size of the stored data URLs."""
+        return sum(len(blob) for blob in self.blobs.values())
+
+    def put(self, data, key=None):
+        """
+        Store base64 image data and return its key.
+
+        Args:
+            data: Base64 PNG string
+            key: Key to store under; defaults to the hash of the data
+        """
+        if key is None:
+            key = hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+        self.blobs.setdefault(key, f"{PNG_DATA_URL_PREFIX}{data}")
+        return key
+
+    def get(self, key):
+        """Return the base64 image data stored under a key."""
+        return self._blob(key).partition(",")[2]
+
+    def _blob(self, key):
+        # Wait for a screenshot that is still being encoded
+        future = self.pending.pop(key, None)
+        if future is not None:
+            self.blobs[key] = future.result()
+        return self.blobs[key]
+
+    def put_screenshot(self, screenshot, upscale=1, executor=None):
+        """
+        Encode and store a screenshot, keyed by the hash of the raw frame.
+        Identical frames are only encoded once, and the encoder's LRU still has
+        recent frames whose blobs were already dropped.
+
+        Args:
+            screenshot: PIL image or (H, W, 3|4) frame array such as Emulator.get_frame()
+            executor: If given, encode on this executor; the reference is returned
+                right away and the image is waited for when it is first needed
+
+        Returns:
+            dict: An image_ref content part for the stored screenshot
+        """
+        key = self.encoder.key(screenshot, upscale)
+        if key not in self.blobs and key not in self.pending:
+            cached = self.encoder.cached(key)
+            if cached is not None:
+                self.blobs[key] = cached
+            elif executor is None:
+                self.blobs[key] = self._encode_screenshot(screenshot, upscale, key)
+            else:
+                if isinstance(screenshot, np.ndarray):
+                    # A frame view changes when the emulator advances: the worker gets a snapshot
+                    screenshot = screenshot.copy()
+                self.pending[key] = executor.submit(self._encode_screenshot, screenshot, upscale, key)
+        if isinstance(screenshot, np.ndarray):
+            height, width = screenshot.shape[:2]
+        else:
+            width, height = screenshot.size
+        return image_ref_part(key, width * upscale, height * upscale)
+
+    def materialize_message(self, message):
+        """
+        Return the request form of a frozen message record, inlining referenced
+        images as data URLs. Records without images are returned unchanged;
+        the data URL strings are shared, never copied.
+        """
+        if not has_image_ref(message):
+            return message
+        return FrozenDict({
+            **message,
+            "content": tuple(self._materialize_part(part) for part in message["content"]),
+        })
+
+    def _materialize_part(self, part):
+        if part.get("type") != "image_ref":
+            return part
+        return FrozenDict({"type": "image_url", "image_url": FrozenDict({"url": self._blob(part["image_ref"]["key"])})})
+
+    def _encode_screenshot(self, screenshot, upscale, key):
+        start = time.perf_counter()
+        blob = self.encoder.encode(screenshot, upscale, key)
+        if self.timer is not None:
+            self.timer.record("encode", time.perf_counter() - start)
+        return blob
+
+    def pin(self, key):
+        """Keep a blob alive while it is not yet referenced by the history."""
+        self.pinned.add(key)
+
+    def unpin(self, key):
+        self.pinned.discard(key)
+
+    def retain(self, messages):
+        """Drop every blob that is no longer referenced by the given messages (or pinned)."""
+        live = {
+            part["image_ref"]["key"]
+            for msg in messages
+            if isinstance(msg.get("content"), tuple)
+            for part in msg["content"]
+            if part.get("type") == "image_ref"
+        }
+        dropped = [key for key in self.blobs if key not in live and key not in self.pinned]
+        for key in dropped:
+            del self.blobs[key]
+        for key in [key for key in self.pending if key not in live and key not in self.pinned]:
+            self.pending.pop(key).cancel()
+        if dropped:
+            logger.debug(f"[BlobStore] Dropped {len(dropped)} unreferenced images, {len(self.blobs)} left")
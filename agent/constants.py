@@ -272,6 +272,30 @@ class Pokemon(IntEnum):
     VICTREEBEL = 0xBE
 
 
+# Species in National Pokedex order. The Pokedex seen/owned flags are indexed by
+# Pokedex number, which differs from the internal species ID used everywhere else.
+POKEDEX_ORDER = (
+    "BULBASAUR", "IVYSAUR", "VENUSAUR", "CHARMANDER", "CHARMELEON", "CHARIZARD", "SQUIRTLE", "WARTORTLE",
+    "BLASTOISE", "CATERPIE", "METAPOD", "BUTTERFREE", "WEEDLE", "KAKUNA", "BEEDRILL", "PIDGEY", "PIDGEOTTO",
+    "PIDGEOT", "RATTATA", "RATICATE", "SPEAROW", "FEAROW", "EKANS", "ARBOK", "PIKACHU", "RAICHU", "SANDSHREW",
+    "SANDSLASH", "NIDORAN_F", "NIDORINA", "NIDOQUEEN", "NIDORAN_M", "NIDORINO", "NIDOKING", "CLEFAIRY",
+    "CLEFABLE", "VULPIX", "NINETALES", "JIGGLYPUFF", "WIGGLYTUFF", "ZUBAT", "GOLBAT", "ODDISH", "GLOOM",
+    "VILEPLUME", "PARAS", "PARASECT", "VENONAT", "VENOMOTH", "DIGLETT", "DUGTRIO", "MEOWTH", "PERSIAN",
+    "PSYDUCK", "GOLDUCK", "MANKEY", "PRIMEAPE", "GROWLITHE", "ARCANINE", "POLIWAG", "POLIWHIRL", "POLIWRATH",
+    "ABRA", "KADABRA", "ALAKAZAM", "MACHOP", "MACHOKE", "MACHAMP", "BELLSPROUT", "WEEPINBELL", "VICTREEBEL",
+    "TENTACOOL", "TENTACRUEL", "GEODUDE", "GRAVELER", "GOLEM", "PONYTA", "RAPIDASH", "SLOWPOKE", "SLOWBRO",
+    "MAGNEMITE", "MAGNETON", "FARFETCHD", "DODUO", "DODRIO", "SEEL", "DEWGONG", "GRIMER", "MUK", "SHELLDER",
+    "CLOYSTER", "GASTLY", "HAUNTER", "GENGAR", "ONIX", "DROWZEE", "HYPNO", "KRABBY", "KINGLER", "VOLTORB",
+    "ELECTRODE", "EXEGGCUTE", "EXEGGUTOR", "CUBONE", "MAROWAK", "HITMONLEE", "HITMONCHAN", "LICKITUNG",
+    "KOFFING", "WEEZING", "RHYHORN", "RHYDON", "CHANSEY", "TANGELA", "KANGASKHAN", "HORSEA", "SEADRA",
+    "GOLDEEN", "SEAKING", "STARYU", "STARMIE", "MR_MIME", "SCYTHER", "JYNX", "ELECTABUZZ", "MAGMAR", "PINSIR",
+    "TAUROS", "MAGIKARP", "GYARADOS", "LAPRAS", "DITTO", "EEVEE", "VAPOREON", "JOLTEON", "FLAREON", "PORYGON",
+    "OMANYTE", "OMASTAR", "KABUTO", "KABUTOPS", "AERODACTYL", "SNORLAX", "ARTICUNO", "ZAPDOS", "MOLTRES",
+    "DRATINI", "DRAGONAIR", "DRAGONITE", "MEWTWO", "MEW",
+)
+POKEDEX_NUMBERS = {name: number for number, name in enumerate(POKEDEX_ORDER, start=1)}
+
+
 class Move(IntEnum):
     """Maps move IDs to their names"""
 
@@ -704,6 +728,93 @@ TILE_PAIR_COLLISIONS_WATER = [
     ("CAVERN", 276, 261),
 ]
 
+# Generation 1 type chart: (attacking type, defending type) -> damage multiplier.
+# Pairs that are not listed deal normal damage.
+TYPE_EFFECTIVENESS = {
+    (PokemonType.NORMAL, PokemonType.ROCK): 0.5,
+    (PokemonType.NORMAL, PokemonType.GHOST): 0.0,
+    (PokemonType.FIGHTING, PokemonType.NORMAL): 2.0,
+    (PokemonType.FIGHTING, PokemonType.FLYING): 0.5,
+    (PokemonType.FIGHTING, PokemonType.POISON): 0.5,
+    (PokemonType.FIGHTING, PokemonType.ROCK): 2.0,
+    (PokemonType.FIGHTING, PokemonType.BUG): 0.5,
+    (PokemonType.FIGHTING, PokemonType.GHOST): 0.0,
+    (PokemonType.FIGHTING, PokemonType.PSYCHIC): 0.5,
+    (PokemonType.FIGHTING, PokemonType.ICE): 2.0,
+    (PokemonType.FLYING, PokemonType.FIGHTING): 2.0,
+    (PokemonType.FLYING, PokemonType.ROCK): 0.5,
+    (PokemonType.FLYING, PokemonType.BUG): 2.0,
+    (PokemonType.FLYING, PokemonType.GRASS): 2.0,
+    (PokemonType.FLYING, PokemonType.ELECTRIC): 0.5,
+    (PokemonType.POISON, PokemonType.POISON): 0.5,
+    (PokemonType.POISON, PokemonType.GROUND): 0.5,
+    (PokemonType.POISON, PokemonType.ROCK): 0.5,
+    (PokemonType.POISON, PokemonType.BUG): 2.0,
+    (PokemonType.POISON, PokemonType.GHOST): 0.5,
+    (PokemonType.POISON, PokemonType.GRASS): 2.0,
+    (PokemonType.GROUND, PokemonType.FLYING): 0.0,
+    (PokemonType.GROUND, PokemonType.POISON): 2.0,
+    (PokemonType.GROUND, PokemonType.ROCK): 2.0,
+    (PokemonType.GROUND, PokemonType.BUG): 0.5,
+    (PokemonType.GROUND, PokemonType.FIRE): 2.0,
+    (PokemonType.GROUND, PokemonType.GRASS): 0.5,
+    (PokemonType.GROUND, PokemonType.ELECTRIC): 2.0,
+    (PokemonType.ROCK, PokemonType.FIGHTING): 0.5,
+    (PokemonType.ROCK, PokemonType.FLYING): 2.0,
+    (PokemonType.ROCK, PokemonType.GROUND): 0.5,
+    (PokemonType.ROCK, PokemonType.BUG): 2.0,
+    (PokemonType.ROCK, PokemonType.FIRE): 2.0,
+    (PokemonType.ROCK, PokemonType.ICE): 2.0,
+    (PokemonType.BUG, PokemonType.FIGHTING): 0.5,
+    (PokemonType.BUG, PokemonType.FLYING): 0.5,
+    (PokemonType.BUG, PokemonType.POISON): 2.0,
+    (PokemonType.BUG, PokemonType.GHOST): 0.5,
+    (PokemonType.BUG, PokemonType.FIRE): 0.5,
+    (PokemonType.BUG, PokemonType.GRASS): 2.0,
+    (PokemonType.BUG, PokemonType.PSYCHIC): 2.0,
+    (PokemonType.GHOST, PokemonType.NORMAL): 0.0,
+    (PokemonType.GHOST, PokemonType.GHOST): 2.0,
+    (PokemonType.GHOST, PokemonType.PSYCHIC): 0.0,  # Gen 1 bug: Ghost has no effect on Psychic
+    (PokemonType.FIRE, PokemonType.ROCK): 0.5,
+    (PokemonType.FIRE, PokemonType.BUG): 2.0,
+    (PokemonType.FIRE, PokemonType.FIRE): 0.5,
+    (PokemonType.FIRE, PokemonType.WATER): 0.5,
+    (PokemonType.FIRE, PokemonType.GRASS): 2.0,
+    (PokemonType.FIRE, PokemonType.ICE): 2.0,
+    (PokemonType.FIRE, PokemonType.DRAGON): 0.5,
+    (PokemonType.WATER, PokemonType.GROUND): 2.0,
+    (PokemonType.WATER, PokemonType.ROCK): 2.0,
+    (PokemonType.WATER, PokemonType.FIRE): 2.0,
+    (PokemonType.WATER, PokemonType.WATER): 0.5,
+    (PokemonType.WATER, PokemonType.GRASS): 0.5,
+    (PokemonType.WATER, PokemonType.DRAGON): 0.5,
+    (PokemonType.GRASS, PokemonType.FLYING): 0.5,
+    (PokemonType.GRASS, PokemonType.POISON): 0.5,
+    (PokemonType.GRASS, PokemonType.GROUND): 2.0,
+    (PokemonType.GRASS, PokemonType.ROCK): 2.0,
+    (PokemonType.GRASS, PokemonType.BUG): 0.5,
+    (PokemonType.GRASS, PokemonType.FIRE): 0.5,
+    (PokemonType.GRASS, PokemonType.WATER): 2.0,
+    (PokemonType.GRASS, PokemonType.GRASS): 0.5,
+    (PokemonType.GRASS, PokemonType.DRAGON): 0.5,
+    (PokemonType.ELECTRIC, PokemonType.FLYING): 2.0,
+    (PokemonType.ELECTRIC, PokemonType.GROUND): 0.0,
+    (PokemonType.ELECTRIC, PokemonType.WATER): 2.0,
+    (PokemonType.ELECTRIC, PokemonType.GRASS): 0.5,
+    (PokemonType.ELECTRIC, PokemonType.ELECTRIC): 0.5,
+    (PokemonType.ELECTRIC, PokemonType.DRAGON): 0.5,
+    (PokemonType.PSYCHIC, PokemonType.FIGHTING): 2.0,
+    (PokemonType.PSYCHIC, PokemonType.POISON): 2.0,
+    (PokemonType.PSYCHIC, PokemonType.PSYCHIC): 0.5,
+    (PokemonType.ICE, PokemonType.FLYING): 2.0,
+    (PokemonType.ICE, PokemonType.GROUND): 2.0,
+    (PokemonType.ICE, PokemonType.WATER): 0.5,
+    (PokemonType.ICE, PokemonType.GRASS): 2.0,
+    (PokemonType.ICE, PokemonType.ICE): 0.5,
+    (PokemonType.ICE, PokemonType.DRAGON): 2.0,
+    (PokemonType.DRAGON, PokemonType.DRAGON): 2.0,
+}
+
 # Revised mapping based on the game's internal item numbering
 ITEM_NAMES = {
     0x01: "MASTER BALL",
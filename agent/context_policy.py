@@ -0,0 +1,131 @@
+import logging
+
+from config import CONTEXT_POLICY_BATCH, IMAGE_TOKEN_BUDGET, KEEP_FULL_SCREENSHOTS, KEEP_REDUCED_SCREENSHOTS
+
+from agent.blob_store import image_ref_part
+from agent.utils import reduce_screenshot_base64
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_STUB = "[Earlier screenshot removed to save context]"
+REDUCED_SIZE = (160, 144)
+
+
+def _stub_images(msg):
+    """Return a copy of a message with every image replaced by a text stub."""
+    return {**msg, "content": [
+        part if part.get("type") != "image_ref" else {"type": "text", "text": SCREENSHOT_STUB}
+        for part in msg["content"]
+    ]}
+
+
+def _is_full_size(part):
+    ref = part["image_ref"]
+    return (ref["width"], ref["height"]) > REDUCED_SIZE
+
+
+def _reduce_images(msg, blob_store):
+    """Return a copy of a message with every full-size image downscaled to 1x 2-bit grayscale."""
+    content = []
+    for part in msg["content"]:
+        if part.get("type") == "image_ref" and _is_full_size(part):
+            reduced = reduce_screenshot_base64(blob_store.get(part["image_ref"]["key"]), REDUCED_SIZE)
+            part = image_ref_part(blob_store.put(reduced), *REDUCED_SIZE)
+        content.append(part)
+    return {**msg, "content": content}
+
+
+class ContextPolicy:
+    """Decides how screenshots in the message history are kept between requests."""
+
+    name = "keep_all"
+
+    def apply(self, history, token_counter, blob_store):
+        """
+        Replace history records whose older screenshots should be reduced or dropped.
+
+        Args:
+            history: The agent's MessageHistory
+            token_counter: The LLMClient's TokenCounter
+            blob_store: The BlobStore holding the referenced screenshots
+        """
+
+
+class TokenBudgetPolicy(ContextPolicy):
+    """
+    Stub out the oldest screenshots once images cost more than IMAGE_TOKEN_BUDGET.
+    At least `batch` are evicted at a time, so the prompt prefix (and its cache)
+    does not change on every step once the budget is reached.
+    """
+
+    name = "token_budget"
+
+    def __init__(self, image_token_budget=IMAGE_TOKEN_BUDGET, batch=CONTEXT_POLICY_BATCH):
+        self.image_token_budget = image_token_budget
+        self.batch = max(batch, 1)
+
+    def apply(self, history, token_counter, blob_store):
+        if token_counter.calibrated(history.raw_image_tokens) <= self.image_token_budget:
+            return
+
+        evicted = 0
+        # A batch never takes the newest screenshot, which the model needs to act on
+        for i in history.image_indices()[:-1]:
+            if evicted >= self.batch and token_counter.calibrated(history.raw_image_tokens) <= self.image_token_budget:
+                break
+            history.replace(i, _stub_images(history[i]))
+            evicted += 1
+        image_tokens = token_counter.calibrated(history.raw_image_tokens)
+
+        logger.info(f"[Context] Evicted {evicted} old screenshots (~{int(image_tokens)} image tokens left)")
+
+
+class RecentScreenshotsPolicy(ContextPolicy):
+    """
+    Keep the last `keep_full` screenshots at full resolution, reduce the
+    `keep_reduced` before them to 1x 2-bit grayscale and stub out the rest.
+
+    Rewriting an old message changes the prompt prefix, which invalidates the
+    provider's prompt cache from that message on. So screenshots are rewritten
+    in batches: up to `batch` extra ones are allowed to pile up, then all of
+    them are reduced or stubbed at once, and the prefix stays stable (and
+    cached) until the next batch.
+    """
+
+    name = "recent_screenshots"
+
+    def __init__(self, keep_full=KEEP_FULL_SCREENSHOTS, keep_reduced=KEEP_REDUCED_SCREENSHOTS, batch=CONTEXT_POLICY_BATCH):
+        self.keep_full = keep_full
+        self.keep_reduced = keep_reduced
+        self.batch = max(batch, 1)
+
+    def apply(self, history, token_counter, blob_store):
+        image_messages = history.image_indices()
+        older = image_messages[:max(len(image_messages) - self.keep_full, 0)]
+        reduced = older[-self.keep_reduced:] if self.keep_reduced else []
+        stubbed = older[:len(older) - len(reduced)]
+        to_reduce = [
+            i for i in reduced
+            if any(part.get("type") == "image_ref" and _is_full_size(part) for part in history[i]["content"])
+        ]
+        if len(to_reduce) < self.batch and len(stubbed) < self.batch:
+            return
+
+        for i in to_reduce:
+            history.replace(i, _reduce_images(history[i], blob_store))
+        for i in stubbed:
+            history.replace(i, _stub_images(history[i]))
+        logger.info(f"[Context] Reduced {len(to_reduce)} and stubbed {len(stubbed)} old screenshots")
+
+
+CONTEXT_POLICIES = {
+    policy.name: policy
+    for policy in (ContextPolicy, TokenBudgetPolicy, RecentScreenshotsPolicy)
+}
+
+
+def get_context_policy(name):
+    """Create the context policy registered under the given name."""
+    if name not in CONTEXT_POLICIES:
+        raise ValueError(f"Unknown context policy '{name}'. Available: {', '.join(CONTEXT_POLICIES)}")
+    return CONTEXT_POLICIES[name]()
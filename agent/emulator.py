@@ -1,19 +1,95 @@
+import hashlib
 import io
 import logging
 import pickle
 from collections import deque
 
+from agent.battle import read_battle_state
 from agent.constants import StatusCondition
 from agent.memory_reader import PokemonRedReader
+from agent.menus import MenuNavigator
 from agent.navigator import Navigator
+from agent.utils import parse_int
 from PIL import Image
 from pyboy import PyBoy
 
 logger = logging.getLogger(__name__)
 
+VALID_BUTTONS = ["a", "b", "start", "select", "up", "down", "left", "right"]
+# Upper bound on the length of one compiled input schedule (one minute of game time)
+MAX_SCHEDULE_FRAMES = 3600
+WAIT_CONDITIONS = ["dialog_closed", "dialog_opened", "battle_ended", "map_changed"]
+
+
+def game_phase(reader):
+    """
+    Classify the game phase from memory: "battle", "menu" (a menu cursor is on
+    screen), "dialog" (a text box is open) or "overworld".
+    """
+    if reader.read_battle_type():
+        return "battle"
+    if reader.has_menu_cursor():
+        return "menu"
+    if reader.is_text_box_open():
+        return "dialog"
+    return "overworld"
+
+
+def format_memory_state(reader, valid_moves):
+    """
+    Describe the game state decoded by a PokemonRedReader, for the model.
+
+    Args:
+        valid_moves: Walkable directions from the collision map
+    """
+    memory_str = ""
+
+    name = reader.read_player_name()
+    if name == "NINTEN":
+        name = "Not yet set"
+    rival_name = reader.read_rival_name()
+    if rival_name == "SONY":
+        rival_name = "Not yet set"
+
+    valid_moves_str = ", ".join(valid_moves) if valid_moves else "None"
+
+    memory_str += f"Player: {name}\n"
+    memory_str += f"Rival: {rival_name}\n"
+    memory_str += f"Money: ${reader.read_money()}\n"
+    memory_str += f"Location: {reader.read_location()}\n"
+    memory_str += f"Coordinates: {reader.read_coordinates()}\n"
+    memory_str += f"Valid Moves: {valid_moves_str}\n"
+    memory_str += f"Badges: {', '.join(reader.read_badges())}\n"
+
+    # Inventory
+    memory_str += "Inventory:\n"
+    for item, qty in reader.read_items():
+        memory_str += f"  {item} x{qty}\n"
+
+    # Dialog
+    dialog = reader.read_dialog()
+    if dialog:
+        memory_str += f"Dialog: {dialog}\n"
+    else:
+        memory_str += "Dialog: None\n"
+
+    # Party Pokemon
+    memory_str += "\nPokemon Party:\n"
+    for pokemon in reader.read_party_pokemon():
+        memory_str += f"\n{pokemon.nickname} ({pokemon.species_name}):\n"
+        memory_str += f"Level {pokemon.level} - HP: {pokemon.current_hp}/{pokemon.max_hp}\n"
+        memory_str += f"Types: {pokemon.type1.name}{', ' + pokemon.type2.name if pokemon.type2 else ''}\n"
+        for move, pp in zip(pokemon.moves, pokemon.move_pp, strict=True):
+            memory_str += f"- {move} (PP: {pp})\n"
+        if pokemon.status != StatusCondition.NONE:
+            memory_str += f"Status: {pokemon.status.get_status_name()}\n"
+
+    return memory_str
+
 
 class Emulator:
     def __init__(self, rom_path, headless=True, sound=False):
+        self.rom_path = rom_path
         if headless:
             self.pyboy = PyBoy(
                 rom_path,
@@ -27,6 +103,7 @@ class Emulator:
                 sound=sound,
             )
         self.navigator = Navigator(self)
+        self.menu_navigator = MenuNavigator(self)
 
     def tick(self, frames):
         """Advance the emulator by the specified number of frames."""
@@ -45,6 +122,16 @@ class Emulator:
         """Get the current screenshot."""
         return Image.fromarray(self.pyboy.screen.ndarray)
 
+    def get_frame(self):
+        """
+        Get a read-only view of PyBoy's screen buffer, (144, 160, 4) RGBA, without
+        copying it. The view is live: it changes when the emulator advances, so
+        copy it if it has to outlive the next tick.
+        """
+        frame = self.pyboy.screen.ndarray.view()
+        frame.flags.writeable = False
+        return frame
+
     def load_state(self, state_filename):
         """
         Load a state from a pickled file into the emulator.
@@ -53,7 +140,18 @@ class Emulator:
         Args:
             state_filename: Path to the state file
         """
-        self.pyboy.load_state(open(state_filename, "rb"))
+        with open(state_filename, "rb") as f:
+            self.pyboy.load_state(f)
+
+    def save_state_bytes(self):
+        """Save the emulator state into memory and return it as bytes."""
+        buffer = io.BytesIO()
+        self.pyboy.save_state(buffer)
+        return buffer.getvalue()
+
+    def load_state_bytes(self, state):
+        """Restore an emulator state returned by save_state_bytes."""
+        self.pyboy.load_state(io.BytesIO(state))
 
     def press_buttons(self, buttons, wait=True):
         """Press a sequence of buttons on the Game Boy.
@@ -68,7 +166,7 @@ class Emulator:
         results = []
         
         for button in buttons:
-            if button not in ["a", "b", "start", "select", "up", "down", "left", "right"]:
+            if button not in VALID_BUTTONS:
                 results.append(f"Invalid button: {button}")
                 continue
                 
@@ -85,6 +183,191 @@ class Emulator:
         
         return "\n".join(results)
 
+    def compile_schedule(self, steps):
+        """
+        Compile input macro steps into a flat schedule of input events.
+
+        Each step is a dict with an optional "button" (held for "hold_frames",
+        default 10, repeated "repeat" times, default 1) followed by "wait_frames"
+        (default 120 after a button, 0 otherwise). A step without a button just waits.
+
+        Returns:
+            list[tuple[str, str | int]]: ("press", button), ("release", button) and ("tick", frames) events
+
+        Raises:
+            ValueError: If a step is invalid or the schedule exceeds MAX_SCHEDULE_FRAMES
+        """
+        if not steps:
+            raise ValueError("No steps specified")
+        if not isinstance(steps, list):
+            raise ValueError(f"Invalid steps {steps!r}: expected a list")
+
+        schedule = []
+        total_frames = 0
+
+        def tick(frames):
+            if frames <= 0:
+                return
+            if schedule and schedule[-1][0] == "tick":
+                schedule[-1] = ("tick", schedule[-1][1] + frames)
+            else:
+                schedule.append(("tick", frames))
+
+        for step in steps:
+            if not isinstance(step, dict):
+                raise ValueError(f"Invalid step {step!r}: expected an object")
+            button = step.get("button")
+            hold_frames = parse_int(step.get("hold_frames", 10), "hold_frames")
+            repeat = parse_int(step.get("repeat", 1), "repeat")
+            wait_frames = parse_int(step.get("wait_frames", 120 if button else 0), "wait_frames")
+            if button is not None and button not in VALID_BUTTONS:
+                raise ValueError(f"Invalid button: {button}")
+            if hold_frames < 1 or repeat < 1 or wait_frames < 0:
+                raise ValueError(f"Invalid timing in step {step}")
+
+            for _ in range(repeat):
+                if button:
+                    schedule.append(("press", button))
+                    tick(hold_frames)
+                    schedule.append(("release", button))
+                    total_frames += hold_frames
+                tick(wait_frames)
+                total_frames += wait_frames
+
+        if total_frames > MAX_SCHEDULE_FRAMES:
+            raise ValueError(f"Input sequence too long: {total_frames} frames (max {MAX_SCHEDULE_FRAMES})")
+        return schedule
+
+    def execute_schedule(self, schedule, stop_on=()):
+        """
+        Run a compiled input schedule.
+
+        Args:
+            schedule: Events from compile_schedule
+            stop_on: Conditions that end the schedule early when they start
+                during it: "dialog" (a text box opens) and/or "battle" (a battle starts)
+
+        Returns:
+            tuple[int, str | None]: Frames run and the condition that stopped the schedule, if any
+        """
+        reader = PokemonRedReader(self.pyboy.memory)
+        checks = {
+            "dialog": reader.is_text_box_open,
+            "battle": lambda: reader.read_battle_type() != 0,
+        }
+        checks = {condition: checks[condition] for condition in stop_on if isinstance(condition, str) and condition in checks}
+        previous = {condition: check() for condition, check in checks.items()}
+        held = set()
+        frames = 0
+
+        for event, arg in schedule:
+            if event == "press":
+                self.pyboy.button_press(arg)
+                held.add(arg)
+            elif event == "release":
+                self.pyboy.button_release(arg)
+                held.discard(arg)
+            elif not checks:
+                self.tick(arg)
+                frames += arg
+            else:
+                # Check the stop conditions every frame
+                for _ in range(arg):
+                    self.pyboy.tick()
+                    frames += 1
+                    for condition, check in checks.items():
+                        current = check()
+                        if current and not previous[condition]:
+                            for button in held:
+                                self.pyboy.button_release(button)
+                            return frames, condition
+                        previous[condition] = current
+
+        return frames, None
+
+    def wait_until(self, conditions, timeout_frames=600):
+        """
+        Run the emulator at maximum speed without input until any of the
+        conditions holds, checking memory every frame.
+
+        Args:
+            conditions (list[str]): Any of WAIT_CONDITIONS
+            timeout_frames (int): Give up after this many frames (at most MAX_SCHEDULE_FRAMES)
+
+        Returns:
+            tuple[int, str | None]: Frames run and the condition that was met, or None on timeout
+        """
+        reader = PokemonRedReader(self.pyboy.memory)
+        start_map = reader.read_map_id()
+        checks = {
+            "dialog_closed": lambda: not reader.is_text_box_open(),
+            "dialog_opened": reader.is_text_box_open,
+            "battle_ended": lambda: reader.read_battle_type() == 0,
+            "map_changed": lambda: reader.read_map_id() != start_map,
+        }
+        if not isinstance(conditions, list):
+            raise ValueError(f"Invalid conditions {conditions!r}: expected a list. Valid: {', '.join(WAIT_CONDITIONS)}")
+        unknown = [condition for condition in conditions if not isinstance(condition, str) or condition not in checks]
+        if unknown or not conditions:
+            raise ValueError(f"Invalid conditions {unknown or conditions}. Valid: {', '.join(WAIT_CONDITIONS)}")
+        checks = [(condition, checks[condition]) for condition in conditions]
+        timeout_frames = max(1, min(parse_int(timeout_frames, "timeout_frames"), MAX_SCHEDULE_FRAMES))
+
+        self.pyboy.set_emulation_speed(0)
+        try:
+            for frame in range(timeout_frames):
+                self.pyboy.tick()
+                for condition, check in checks:
+                    if check():
+                        return frame + 1, condition
+        finally:
+            self.pyboy.set_emulation_speed(1)
+        return timeout_frames, None
+
+    def advance_dialog(self, max_presses=40):
+        """
+        Advance a non-interactive text box by pressing A until it closes or
+        needs a decision (a menu cursor such as a YES/NO box appears).
+
+        Args:
+            max_presses (int): Upper bound on A presses
+
+        Returns:
+            tuple[list[str], int, int]: Dialog lines seen, A presses made, and
+            the number of times the dialog text changed
+        """
+        reader = PokemonRedReader(self.pyboy.memory)
+        transcript = []
+        presses = 0
+        pages = 0
+        dialog = reader.read_dialog()
+
+        while presses < max_presses and reader.is_text_box_open() and not reader.has_menu_cursor():
+            for line in dialog.splitlines():
+                if line not in transcript[-4:]:
+                    transcript.append(line)
+            self.press_buttons(["a"], True)
+            presses += 1
+            new_dialog = reader.read_dialog()
+            if new_dialog != dialog:
+                pages += 1
+            dialog = new_dialog
+
+        for line in dialog.splitlines():
+            if line not in transcript[-4:]:
+                transcript.append(line)
+        return transcript, presses, pages
+
+    def get_game_phase(self):
+        """
+        Classify the current game phase from memory.
+
+        Returns:
+            str: "battle", "menu" (a menu cursor is on screen), "dialog" (a text box
+            is open) or "overworld"
+        """
+        return game_phase(PokemonRedReader(self.pyboy.memory))
+
     def get_coordinates(self):
         """
         Returns the player's current coordinates from game memory.
@@ -290,56 +573,52 @@ class Emulator:
         """
         return self.navigator.find_path(target_row, target_col)
 
+    def use_item(self, item, slot=None):
+        """Use a bag item, optionally on a party slot (1-6). See MenuNavigator.use_item."""
+        return self.menu_navigator.use_item(item, slot)
+
+    def switch_pokemon(self, slot):
+        """Switch to a party slot (1-6) in battle. See MenuNavigator.switch_pokemon."""
+        return self.menu_navigator.switch_pokemon(slot)
+
+    def use_move(self, slot):
+        """Use a move slot (1-4) in battle. See MenuNavigator.use_move."""
+        return self.menu_navigator.use_move(slot)
+
+    def run_from_battle(self):
+        """Select RUN in the battle menu. See MenuNavigator.run_from_battle."""
+        return self.menu_navigator.run_from_battle()
+
+    def is_battle_menu_open(self):
+        """Check if the battle menu is waiting for input."""
+        return self.menu_navigator.is_battle_menu_open()
+
+    def get_battle_state(self):
+        """
+        Decode the current battle from memory.
+
+        Returns:
+            BattleState | None: Both Pokemon in battle and their moves, or None outside of a battle
+        """
+        return read_battle_state(PokemonRedReader(self.pyboy.memory))
+
+    def type_name(self, text, finish=True):
+        """Type a name on the name-entry screen. See MenuNavigator.type_name."""
+        return self.menu_navigator.type_name(text, finish)
+
     def get_state_from_memory(self) -> str:
         """
         Reads the game state from memory and returns a string representation of it.
         """
-        reader = PokemonRedReader(self.pyboy.memory)
-        memory_str = ""
-
-        name = reader.read_player_name()
-        if name == "NINTEN":
-            name = "Not yet set"
-        rival_name = reader.read_rival_name()
-        if rival_name == "SONY":
-            rival_name = "Not yet set"
-
-        # Get valid moves
-        valid_moves = self.get_valid_moves()
-        valid_moves_str = ", ".join(valid_moves) if valid_moves else "None"
-
-        memory_str += f"Player: {name}\n"
-        memory_str += f"Rival: {rival_name}\n"
-        memory_str += f"Money: ${reader.read_money()}\n"
-        memory_str += f"Location: {reader.read_location()}\n"
-        memory_str += f"Coordinates: {reader.read_coordinates()}\n"
-        memory_str += f"Valid Moves: {valid_moves_str}\n"
-        memory_str += f"Badges: {', '.join(reader.read_badges())}\n"
-
-        # Inventory
-        memory_str += "Inventory:\n"
-        for item, qty in reader.read_items():
-            memory_str += f"  {item} x{qty}\n"
-
-        # Dialog
-        dialog = reader.read_dialog()
-        if dialog:
-            memory_str += f"Dialog: {dialog}\n"
-        else:
-            memory_str += "Dialog: None\n"
-
-        # Party Pokemon
-        memory_str += "\nPokemon Party:\n"
-        for pokemon in reader.read_party_pokemon():
-            memory_str += f"\n{pokemon.nickname} ({pokemon.species_name}):\n"
-            memory_str += f"Level {pokemon.level} - HP: {pokemon.current_hp}/{pokemon.max_hp}\n"
-            memory_str += f"Types: {pokemon.type1.name}{', ' + pokemon.type2.name if pokemon.type2 else ''}\n"
-            for move, pp in zip(pokemon.moves, pokemon.move_pp, strict=True):
-                memory_str += f"- {move} (PP: {pp})\n"
-            if pokemon.status != StatusCondition.NONE:
-                memory_str += f"Status: {pokemon.status.get_status_name()}\n"
-
-        return memory_str
+        return format_memory_state(PokemonRedReader(self.pyboy.memory), self.get_valid_moves())
+
+    def get_canonical_state(self) -> str:
+        """
+        Returns a canonical description of the current game state: the decoded
+        memory state plus a hash of the screen (to tell apart e.g. cursor positions).
+        """
+        frame_hash = hashlib.blake2b(self.pyboy.screen.ndarray.tobytes(), digest_size=16).hexdigest()
+        return f"{self.get_state_from_memory()}\nFrame: {frame_hash}"
 
     def stop(self):
         self.pyboy.stop()
\ No newline at end of file
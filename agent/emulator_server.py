@@ -0,0 +1,196 @@
+import functools
+import hashlib
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from agent.battle import read_battle_state
+from agent.emulator import Emulator, format_memory_state, game_phase
+from agent.memory_reader import PokemonRedReader
+from agent.menus import battle_menu_open
+
+logger = logging.getLogger(__name__)
+
+SCREEN_SHAPE = (144, 160, 4)  # pyboy.screen.ndarray: rows, columns, RGBA
+WRAM_START = 0xC000
+WRAM_END = 0xE000
+ROM_BANK_START = 0x4000
+ROM_BANK_END = 0x8000
+ROM_BANK_SIZE = 0x4000
+
+
+class SharedMemoryView:
+    """
+    Read-only Game Boy memory for PokemonRedReader in the agent process: WRAM
+    (C000-DFFF) published by an emulator server, plus switchable ROM banks read
+    from the ROM file. Indexed like pyboy.memory: an address, a bounded slice of
+    addresses, or (bank, address) for ROM data such as the move table. Other
+    regions (VRAM, OAM, HRAM) are not shared and raise IndexError.
+    """
+
+    def __init__(self, buffer, rom=None):
+        self.buffer = buffer
+        self.rom = rom
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            bank, addr = key
+            if self.rom is None or not ROM_BANK_START <= addr < ROM_BANK_END:
+                raise IndexError(f"Only switchable ROM banks (4000-7FFF) can be read by bank, not {bank:#04x}:{addr:#06x}")
+            offset = bank * ROM_BANK_SIZE + addr - ROM_BANK_START
+            if offset >= len(self.rom):
+                raise IndexError(f"ROM bank {bank:#04x} is outside the ROM")
+            return self.rom[offset]
+        if isinstance(key, slice):
+            if key.start is None or key.stop is None or key.step not in (None, 1):
+                raise IndexError("Only bounded slices of WRAM addresses can be read")
+            if key.start < WRAM_START or key.stop > WRAM_END:
+                raise IndexError(f"Addresses {key.start:#06x}-{key.stop:#06x} are outside WRAM")
+            return list(self.buffer[key.start - WRAM_START : key.stop - WRAM_START])
+        if not WRAM_START <= key < WRAM_END:
+            raise IndexError(f"Address {key:#06x} is outside WRAM")
+        return self.buffer[key - WRAM_START]
+
+
+def _serve(rom_path, headless, sound, commands, responses, frame_name, wram_name):
+    """Emulator server loop: run commands from the queue and publish the frame and WRAM after each."""
+    frame_shm = shared_memory.SharedMemory(name=frame_name)
+    wram_shm = shared_memory.SharedMemory(name=wram_name)
+    frame = np.ndarray(SCREEN_SHAPE, dtype=np.uint8, buffer=frame_shm.buf)
+    wram = np.ndarray((WRAM_END - WRAM_START,), dtype=np.uint8, buffer=wram_shm.buf)
+    try:
+        emulator = Emulator(rom_path, headless, sound)
+    except Exception as e:
+        responses.put((False, e))
+        return
+
+    def publish():
+        np.copyto(frame, emulator.pyboy.screen.ndarray)
+        wram[:] = emulator.pyboy.memory[WRAM_START:WRAM_END]
+
+    publish()
+    responses.put((True, None))
+    while True:
+        name, args, kwargs = commands.get()
+        if name == "stop":
+            emulator.stop()
+            responses.put((True, None))
+            break
+        try:
+            result = (True, getattr(emulator, name)(*args, **kwargs))
+        except Exception as e:
+            result = (False, e)
+        publish()
+        responses.put(result)
+
+    del frame, wram
+    frame_shm.close()
+    wram_shm.close()
+
+
+class RemoteEmulator:
+    """
+    Runs an Emulator in its own process behind a command queue.
+
+    Commands that advance the emulator are forwarded to the server process, so
+    emulation does not share the GIL with agent-side work such as encoding,
+    logging and waiting on the LLM. After every command the server copies the
+    screen and WRAM into shared memory, and the game state is decoded from there
+    in this process with a PokemonRedReader, without pickling. Only what needs
+    VRAM or OAM (collision map, valid moves, sprites) is still asked of the
+    server. Results of forwarded calls must be picklable.
+    """
+
+    def __init__(self, rom_path, headless=True, sound=False):
+        self.rom_path = rom_path
+        self._frame_shm = shared_memory.SharedMemory(create=True, size=int(np.prod(SCREEN_SHAPE)))
+        self._wram_shm = shared_memory.SharedMemory(create=True, size=WRAM_END - WRAM_START)
+        self._commands = multiprocessing.Queue()
+        self._responses = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(rom_path, headless, sound, self._commands, self._responses,
+                  self._frame_shm.name, self._wram_shm.name),
+            name="emulator-server",
+            daemon=True,
+        )
+        self._process.start()
+        ok, error = self._responses.get()
+        if not ok:
+            self._release()
+            raise error
+
+        self.frame = np.ndarray(SCREEN_SHAPE, dtype=np.uint8, buffer=self._frame_shm.buf)
+        self.frame.flags.writeable = False
+        with open(rom_path, "rb") as f:
+            rom = f.read()
+        self.memory = SharedMemoryView(self._wram_shm.buf, rom)
+        self.reader = PokemonRedReader(self.memory)
+
+    def call(self, name, *args, **kwargs):
+        """Run an Emulator method in the server process and return its result."""
+        self._commands.put((name, args, kwargs))
+        ok, value = self._responses.get()
+        if not ok:
+            raise value
+        return value
+
+    def __getattr__(self, name):
+        # Only reached for attributes not defined here: forward them as Emulator methods
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    def get_screenshot(self):
+        """Get the current screenshot from shared memory (one copy, no pickling)."""
+        return Image.fromarray(self.frame)
+
+    def get_frame(self):
+        """Read-only view of the frame in shared memory; it changes with the next command."""
+        return self.frame
+
+    # Decoded in this process from the shared WRAM (see Emulator for the docs)
+
+    def get_game_phase(self):
+        return game_phase(self.reader)
+
+    def get_coordinates(self):
+        return self.reader.read_coordinates()
+
+    def get_active_dialog(self):
+        return self.reader.read_dialog() or None
+
+    def get_location(self):
+        return self.reader.read_location()
+
+    def is_battle_menu_open(self):
+        return battle_menu_open(self.reader)
+
+    def get_battle_state(self):
+        return read_battle_state(self.reader)
+
+    def get_state_from_memory(self):
+        # The collision map is built from VRAM, so only the valid moves come from the server
+        return format_memory_state(self.reader, self.call("get_valid_moves"))
+
+    def get_canonical_state(self):
+        frame_hash = hashlib.blake2b(self.frame.data, digest_size=16).hexdigest()
+        return f"{self.get_state_from_memory()}\nFrame: {frame_hash}"
+
+    def _release(self):
+        """Close and unlink the shared memory blocks; a no-op once released."""
+        for shm in (self._frame_shm, self._wram_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._frame_shm = self._wram_shm = None
+
+    def stop(self):
+        if self._process.is_alive():
+            self.call("stop")
+            self._process.join(timeout=10)
+        self.frame = self.memory = self.reader = None
+        self._release()
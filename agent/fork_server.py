@@ -0,0 +1,142 @@
+import gc
+import logging
+import os
+import pickle
+import time
+import traceback
+
+from agent.emulator import Emulator
+
+logger = logging.getLogger(__name__)
+
+
+class ForkedSession:
+    """Handle to a child process started by ForkServer.spawn."""
+
+    def __init__(self, pid, read_fd):
+        self.pid = pid
+        self._read_fd = read_fd
+        self._result = None
+        self._done = False
+
+    def result(self):
+        """
+        Wait for the child and return what its target returned.
+
+        Raises:
+            RuntimeError: If the target raised or the child died without a result
+        """
+        if not self._done:
+            chunks = []
+            with os.fdopen(self._read_fd, "rb") as f:
+                while chunk := f.read(1 << 16):
+                    chunks.append(chunk)
+            _, status = os.waitpid(self.pid, 0)
+            self._done = True
+            if not chunks:
+                raise RuntimeError(f"Session {self.pid} exited without a result (status {status})")
+            self._result = pickle.loads(b"".join(chunks))
+        ok, value = self._result
+        if not ok:
+            raise RuntimeError(f"Session {self.pid} failed:\n{value}")
+        return value
+
+
+class ForkServer:
+    """
+    Boots one headless Emulator and forks copy-on-write children from it.
+
+    Constructing PyBoy, loading the ROM and warming up take seconds; a forked
+    child starts with all of that already done and only restores the requested
+    savestate. The ROM, the emulator and the constant tables stay on pages shared
+    with the server until a child writes to them. Requires os.fork (Linux, macOS).
+    """
+
+    def __init__(self, rom_path):
+        start = time.perf_counter()
+        self.emulator = Emulator(rom_path, headless=True)
+        self.emulator.initialize()
+        self.emulator.pyboy.set_emulation_speed(0)
+        # Move everything allocated so far out of the collector's reach, so garbage
+        # collection in the children does not touch (and copy) the shared pages
+        gc.collect()
+        gc.freeze()
+        self.boot_seconds = time.perf_counter() - start
+        logger.info(f"[ForkServer] Emulator booted in {self.boot_seconds:.2f}s")
+
+    def spawn(self, state, target, *args):
+        """
+        Fork a child that restores a savestate and runs target(emulator, *args).
+
+        Args:
+            state: Savestate bytes, a path to a state file, or None for the boot state
+            target: Function to run in the child; its return value must be picklable
+
+        Returns:
+            ForkedSession: Handle to collect the result
+        """
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid:
+            os.close(write_fd)
+            return ForkedSession(pid, read_fd)
+
+        # Child
+        os.close(read_fd)
+        try:
+            if isinstance(state, bytes):
+                self.emulator.load_state_bytes(state)
+            elif state is not None:
+                self.emulator.load_state(state)
+            result = (True, target(self.emulator, *args))
+        except BaseException:
+            result = (False, traceback.format_exc())
+        try:
+            payload = pickle.dumps(result)
+        except Exception:
+            payload = pickle.dumps((False, traceback.format_exc()))
+        with os.fdopen(write_fd, "wb") as f:
+            f.write(payload)
+        os._exit(0)
+
+    def map(self, target, states, *args, max_parallel=None):
+        """
+        Run target(emulator, *args) from each savestate in its own child, at most
+        max_parallel (default: the number of CPU cores) at a time.
+
+        Returns:
+            list: The results, in the order of the states
+        """
+        max_parallel = max_parallel or os.cpu_count() or 1
+        results = []
+        running = []
+        for state in states:
+            if len(running) >= max_parallel:
+                results.append(running.pop(0).result())
+            running.append(self.spawn(state, target, *args))
+        results.extend(session.result() for session in running)
+        return results
+
+    def stop(self):
+        self.emulator.stop()
+
+
+if __name__ == "__main__":
+    # Benchmark: session start latency, booting an emulator vs forking a pre-booted one
+    import sys
+
+    def _location(emulator):
+        return emulator.get_location()
+
+    rom = sys.argv[1] if len(sys.argv) > 1 else "pokemon.gb"
+    server = ForkServer(rom)
+    state = server.emulator.save_state_bytes()
+
+    start = time.perf_counter()
+    sessions = [server.spawn(state, _location) for _ in range(8)]
+    locations = [session.result() for session in sessions]
+    fork_ms = (time.perf_counter() - start) * 1000 / len(sessions)
+
+    print(f"boot: {server.boot_seconds * 1000:.0f} ms per emulator")
+    print(f"fork + restore + run: {fork_ms:.1f} ms per session ({locations[0]})")
+    server.stop()
@@ -0,0 +1,131 @@
+from agent.tokens import estimate_image_tokens_in_message, estimate_message_tokens
+
+
+class FrozenDict(dict):
+    """A dict that cannot be modified after creation. Still serializes like a plain dict."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Message records are immutable; build a new record instead")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+    __ior__ = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDicts and lists to tuples."""
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def has_image_ref(message):
+    """Check if a message references a screenshot in the BlobStore."""
+    content = message.get("content")
+    return isinstance(content, tuple) and any(part.get("type") == "image_ref" for part in content)
+
+
+class MessageHistory:
+    """
+    The agent's conversation history as a list of immutable message records.
+
+    Records are never modified in place, so their request form (with screenshots
+    inlined from the BlobStore) and token estimates are computed once per record
+    and reused on every following request.
+    """
+
+    def __init__(self, blob_store, model, messages=()):
+        self.blob_store = blob_store
+        self.model = model
+        self.reset(messages)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def reset(self, messages=()):
+        """Replace the whole history with the given messages."""
+        self.records = []
+        self._materialized = []
+        self._tokens = []
+        self._image_tokens = []
+        self.raw_tokens = 0
+        self.raw_image_tokens = 0
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        """Freeze and append a message."""
+        self.records.append(None)
+        self._materialized.append(None)
+        self._tokens.append(0)
+        self._image_tokens.append(0)
+        self.replace(len(self.records) - 1, message)
+
+    def replace(self, index, message):
+        """Replace the record at the given index with a new (frozen) message."""
+        record = freeze(message)
+        tokens = estimate_message_tokens(record, self.model)
+        image_tokens = estimate_image_tokens_in_message(record, self.model)
+        self.raw_tokens += tokens - self._tokens[index]
+        self.raw_image_tokens += image_tokens - self._image_tokens[index]
+        self.records[index] = record
+        self._materialized[index] = None
+        self._tokens[index] = tokens
+        self._image_tokens[index] = image_tokens
+
+    def splice(self, count, messages):
+        """Replace the first `count` records with the given messages, keeping everything after them."""
+        tail = (
+            self.records[count:],
+            self._materialized[count:],
+            self._tokens[count:],
+            self._image_tokens[count:],
+        )
+        self.reset(messages)
+        self.records += tail[0]
+        self._materialized += tail[1]
+        self._tokens += tail[2]
+        self._image_tokens += tail[3]
+        self.raw_tokens += sum(tail[2])
+        self.raw_image_tokens += sum(tail[3])
+
+    def raw_tokens_for(self, model):
+        """Raw token estimate of the history for another model; images are priced per model."""
+        if model == self.model:
+            return self.raw_tokens
+        return self.raw_tokens - self.raw_image_tokens + sum(
+            estimate_image_tokens_in_message(self.records[i], model) for i in self.image_indices()
+        )
+
+    def image_indices(self):
+        """Return the indices of records that reference screenshots, oldest first."""
+        return [i for i, tokens in enumerate(self._image_tokens) if tokens]
+
+    def request_messages(self):
+        """
+        Return the history in request form, with referenced screenshots inlined.
+
+        The returned list is new but its records are shared and immutable.
+        """
+        for i, record in enumerate(self._materialized):
+            if record is None:
+                self._materialized[i] = self.blob_store.materialize_message(self.records[i])
+        return list(self._materialized)
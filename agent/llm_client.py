@@ -1,12 +1,45 @@
+import json
 import logging
 import os
+import statistics
+import time
+import uuid
+
+import httpx
 from openai import OpenAI
-from config import MODEL_NAME, MAX_TOKENS, TEMPERATURE, PROMPT_CACHING_ENABLED, PROMPT_CACHE_TTL
+from openai.types.chat import ChatCompletion
+from config import (
+    CACHED_REQUEST_SERIALIZATION,
+    MAX_TOKENS,
+    MODEL_NAME,
+    MODEL_ROUTING_ENABLED,
+    MODEL_TIERS,
+    PHASE_MODEL_TIERS,
+    PROMPT_CACHE_MAX_BREAKPOINTS,
+    PROMPT_CACHE_ROLLING,
+    PROMPT_CACHE_TTL,
+    PROMPT_CACHING_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_FLUSH_EVERY,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL,
+    TEMPERATURE,
+)
+
+from agent.history import FrozenDict, freeze
+from agent.request_body import RequestBodySerializer
+from agent.response_cache import ResponseCache
+from agent.tokens import TokenCounter
 
 logger = logging.getLogger(__name__)
 
 class LLMClient:
-    def __init__(self):
+    def __init__(self, rate_limiter=None):
+        """
+        Args:
+            rate_limiter: Optional TokenBucketRateLimiter shared with other agent processes
+        """
         api_key = os.environ.get("OPENROUTER_API_KEY")
         if not api_key:
             raise ValueError(
@@ -17,73 +50,346 @@ class LLMClient:
             base_url="https://openrouter.ai/api/v1",
             api_key=api_key
         )
+        # Raw HTTP client for requests whose body is built by RequestBodySerializer
+        self.http = httpx.Client(
+            base_url="https://openrouter.ai/api/v1",
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+            timeout=600,
+        )
+        self.serializer = RequestBodySerializer()
+        # id(message) -> (message, ttl, annotated copy) for frozen messages annotated by apply_cache_control
+        self._annotations = {}
+        # Source messages that carried the rolling breakpoint in recent requests, newest first
+        self._rolling_breakpoints = []
+        self.token_counter = TokenCounter(MODEL_NAME)
+        # One entry per request: request_bytes, estimated_tokens, prompt_tokens, cached_tokens
+        self.request_stats = []
+        # Per model tier: request count, latencies, token usage and reported cost
+        self.tier_stats = {}
+        self.rate_limiter = rate_limiter
+        self.rate_limit_wait = 0.0
+        self.response_cache = (
+            ResponseCache(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_FLUSH_EVERY)
+            if RESPONSE_CACHE_ENABLED else None
+        )
 
     def apply_cache_control(self, messages, enabled=True, ttl="5m"):
-        """Apply OpenRouter prompt caching breakpoints to the outgoing messages."""
+        """
+        Apply OpenRouter prompt caching breakpoints to the outgoing messages.
+
+        Returns a new message list; only the annotated messages are copied, all
+        other messages are shared with the input and never modified. Annotated
+        copies of frozen messages are reused between calls, so they keep their
+        cached serialization.
+        """
         if not enabled or not messages:
             return messages
 
+        annotations = {}
+
+        def annotate(msg, build):
+            if not isinstance(msg, FrozenDict):
+                return build(msg)
+            cached = self._annotations.get(id(msg))
+            if cached is None or cached[0] is not msg or cached[1] != ttl:
+                cached = (msg, ttl, freeze(build(msg)))
+            annotations[id(msg)] = cached
+            return cached[2]
+
         if ttl not in ("5m", "1h"):
             ttl = "5m"
 
         cache_control = {"type": "ephemeral", "ttl": ttl}
+        breakpoint_part = {"type": "text", "text": "", "cache_control": cache_control}
+        messages = list(messages)
+        try:
+            self._apply_breakpoints(messages, annotate, cache_control, breakpoint_part)
+        finally:
+            self._annotations = annotations
+        return messages
 
+    def _apply_breakpoints(self, messages, annotate, cache_control, breakpoint_part):
+        """Replace the messages that get a cache breakpoint with annotated copies."""
         # 1) System prompt breakpoint (stable prefix)
-        for msg in messages:
+        for i, msg in enumerate(messages):
             if msg.get("role") == "system":
                 content = msg.get("content")
                 if isinstance(content, str):
-                    msg["content"] = [
-                        {"type": "text", "text": content},
-                        {"type": "text", "text": "", "cache_control": cache_control},
-                    ]
-                elif isinstance(content, list):
+                    messages[i] = annotate(msg, lambda m: {
+                        **m, "content": [{"type": "text", "text": m["content"]}, breakpoint_part],
+                    })
+                elif isinstance(content, (list, tuple)):
                     # Ensure there's at least one text part to attach cache_control to
                     has_text = any(isinstance(p, dict) and p.get("type") == "text" for p in content)
                     if has_text:
-                        content.append({"type": "text", "text": "", "cache_control": cache_control})
+                        messages[i] = annotate(msg, lambda m: {**m, "content": [*m["content"], breakpoint_part]})
                 break
 
+        breakpoints_used = 1 if messages and messages[0].get("role") == "system" else 0
+        stable_start = breakpoints_used
+
         # 2) Summary breakpoint (stable prefix after summarization)
-        for msg in messages:
-            if msg.get("role") == "user" and isinstance(msg.get("content"), list):
-                parts = msg["content"]
+        for i, msg in enumerate(messages):
+            if msg.get("role") == "user" and isinstance(msg.get("content"), (list, tuple)):
                 # Identify the summary text block
                 summary_idx = None
-                for i, part in enumerate(parts):
+                for j, part in enumerate(msg["content"]):
                     if isinstance(part, dict) and part.get("type") == "text":
                         if "CONVERSATION HISTORY SUMMARY" in (part.get("text") or ""):
-                            summary_idx = i
+                            summary_idx = j
                             break
 
                 if summary_idx is None:
                     continue
 
-                # Place breakpoint on the next text block after the summary
-                for j in range(summary_idx + 1, len(parts)):
-                    part = parts[j]
-                    if isinstance(part, dict) and part.get("type") == "text":
-                        part["cache_control"] = cache_control
-                        return messages
+                def add_summary_breakpoint(m, summary_idx=summary_idx):
+                    parts = list(m["content"])
+                    # Place breakpoint on the next text block after the summary
+                    for j in range(summary_idx + 1, len(parts)):
+                        part = parts[j]
+                        if isinstance(part, dict) and part.get("type") == "text":
+                            parts[j] = {**part, "cache_control": cache_control}
+                            break
+                    else:
+                        # If no subsequent text block exists, add a tiny one as breakpoint
+                        parts.insert(summary_idx + 1, breakpoint_part)
+                    return {**m, "content": parts}
 
-                # If no subsequent text block exists, add a tiny one as breakpoint
-                parts.insert(summary_idx + 1, {"type": "text", "text": "", "cache_control": cache_control})
-                return messages
+                messages[i] = annotate(msg, add_summary_breakpoint)
+                breakpoints_used += 1
+                stable_start = i + 1
+                break
 
-        return messages
+        # 3) Rolling breakpoints along the history
+        if PROMPT_CACHE_ROLLING:
+            self._apply_rolling_breakpoints(
+                messages, annotate, cache_control, breakpoint_part,
+                stable_start, PROMPT_CACHE_MAX_BREAKPOINTS - breakpoints_used,
+            )
+
+    def _apply_rolling_breakpoints(self, messages, annotate, cache_control, breakpoint_part, start, available):
+        """
+        Advance a cache breakpoint along the history.
+
+        The newest eligible message gets a breakpoint so the whole prompt is written
+        to the cache; the messages that carried it in the previous requests keep one
+        so this request reads the prefix cached by them. Providers cap the number of
+        breakpoints per request (4 for Anthropic), so at most `available` are used.
+        """
+        if available <= 0:
+            return
+
+        def add_breakpoint(m):
+            content = m["content"]
+            if isinstance(content, str):
+                return {**m, "content": [{"type": "text", "text": content, "cache_control": cache_control}]}
+            parts = list(content)
+            for j in reversed(range(len(parts))):
+                if parts[j].get("type") == "text":
+                    parts[j] = {**parts[j], "cache_control": cache_control}
+                    break
+            else:
+                parts.append(breakpoint_part)
+            return {**m, "content": parts}
+
+        # Breakpoints go on user/tool messages with content; assistant tool call messages are skipped
+        eligible = [
+            i for i in range(start, len(messages))
+            if messages[i].get("role") in ("user", "tool") and messages[i].get("content")
+        ]
+        if not eligible:
+            return
+
+        tail = eligible[-1]
+        positions = {id(messages[i]): i for i in eligible[:-1]}
+        targets = [tail] + [
+            positions[id(source)] for source in self._rolling_breakpoints
+            if id(source) in positions and positions[id(source)] != tail
+        ][:available - 1]
+
+        self._rolling_breakpoints = [messages[i] for i in targets]
+        for i in targets:
+            messages[i] = annotate(messages[i], add_breakpoint)
+
+    def route(self, phase):
+        """
+        Pick the model tier for a game phase.
+
+        Args:
+            phase: Game phase from Emulator.get_game_phase ("dialog", "menu", "battle",
+                "overworld"), or None for requests not tied to a game phase
+
+        Returns:
+            tuple[str, str]: (tier name, model name)
+        """
+        if not MODEL_ROUTING_ENABLED or phase is None:
+            return "default", MODEL_NAME
+        tier = PHASE_MODEL_TIERS.get(phase, "default")
+        return tier, MODEL_TIERS.get(tier, MODEL_NAME)
+
+    def models(self):
+        """Return every model requests may be routed to."""
+        if not MODEL_ROUTING_ENABLED:
+            return [MODEL_NAME]
+        return sorted({MODEL_NAME, *(MODEL_TIERS.get(tier, MODEL_NAME) for tier in PHASE_MODEL_TIERS.values())})
+
+    def create_completion(self, messages, tools=None, temperature=None, phase=None, cache_state=None):
+        """
+        Send a chat completion request.
+
+        Args:
+            messages: Messages including the system message
+            tools: Tool definitions
+            temperature: Sampling temperature (defaults to TEMPERATURE)
+            phase: Game phase used to route the request to a model tier
+            cache_state: (canonical game state, recent actions) to look the response up in the
+                response cache; None skips the cache
+        """
+        tier, model = self.route(phase)
+
+        cache_key = None
+        if self.response_cache is not None and cache_state is not None:
+            cache_key = ResponseCache.make_key(model, *cache_state)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(
+                    f"[ResponseCache] Hit, replaying {len(cached['tool_calls'])} tool calls "
+                    f"({self.response_cache.hits} hits, {self.response_cache.misses} misses)"
+                )
+                return self._cached_completion(cached, model)
 
-    def create_completion(self, messages, tools=None, temperature=None):
-        # Note: messages should be a copy if the caller wants to preserve the original structure
-        # (apply_cache_control modifies in-place)
         messages_with_cache = self.apply_cache_control(
             messages,
             enabled=PROMPT_CACHING_ENABLED,
             ttl=PROMPT_CACHE_TTL
         )
-        return self.client.chat.completions.create(
-            model=MODEL_NAME,
-            max_tokens=MAX_TOKENS,
-            messages=messages_with_cache,
-            tools=tools,
-            temperature=temperature if temperature is not None else TEMPERATURE,
+        estimate = self.token_counter.estimate_messages(messages_with_cache, tools, model)
+        temperature = temperature if temperature is not None else TEMPERATURE
+        if self.rate_limiter is not None:
+            self.rate_limit_wait += self.rate_limiter.acquire(estimate)
+        start = time.perf_counter()
+        if CACHED_REQUEST_SERIALIZATION:
+            body = self.serializer.build(messages_with_cache, model, MAX_TOKENS, temperature, tools)
+            request_bytes = len(body)
+            response = self._post_completion(body)
+        else:
+            request_bytes = len(json.dumps(messages_with_cache)) + (len(json.dumps(tools)) if tools else 0)
+            response = self.client.chat.completions.create(
+                model=model,
+                max_tokens=MAX_TOKENS,
+                messages=messages_with_cache,
+                tools=tools,
+                temperature=temperature,
+            )
+        latency = time.perf_counter() - start
+        usage = getattr(response, "usage", None)
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(estimate, getattr(usage, "total_tokens", None) or estimate)
+        self.token_counter.observe(estimate, usage, model)
+        self._record_tier(tier, model, phase, latency, usage)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        self.request_stats.append({
+            "request_bytes": request_bytes,
+            "estimated_tokens": estimate,
+            "prompt_tokens": self.token_counter.last_actual,
+            "cached_tokens": cached_tokens,
+        })
+        logger.info(f"[Request] {request_bytes} bytes, ~{estimate} prompt tokens")
+        if self.token_counter.last_actual:
+            logger.info(
+                f"[Cache] cached {cached_tokens}/{self.token_counter.last_actual} prompt tokens "
+                f"({cached_tokens / self.token_counter.last_actual:.0%}), "
+                f"session cache ratio {self.cache_hit_ratio():.0%}"
+            )
+
+        if cache_key is not None and getattr(response, "choices", None):
+            message = response.choices[0].message
+            if message.tool_calls:
+                self.response_cache.put(cache_key, {
+                    "content": message.content or "",
+                    "tool_calls": [
+                        {"name": tc.function.name, "arguments": tc.function.arguments}
+                        for tc in message.tool_calls
+                    ],
+                })
+        return response
+
+    def _cached_completion(self, cached, model):
+        """Build a ChatCompletion from a response cache entry, with fresh tool call ids."""
+        return ChatCompletion.construct(
+            id=f"cached-{uuid.uuid4().hex}",
+            object="chat.completion",
+            created=int(time.time()),
+            model=model,
+            choices=[{
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": cached["content"],
+                    "tool_calls": [
+                        {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": tool_call}
+                        for tool_call in cached["tool_calls"]
+                    ],
+                },
+            }],
+            usage=None,
         )
+
+    def _record_tier(self, tier, model, phase, latency, usage):
+        stats = self.tier_stats.setdefault(tier, {
+            "model": model, "requests": 0, "latencies": [],
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+        })
+        stats["requests"] += 1
+        stats["latencies"].append(latency)
+        stats["prompt_tokens"] += getattr(usage, "prompt_tokens", None) or 0
+        stats["completion_tokens"] += getattr(usage, "completion_tokens", None) or 0
+        # OpenRouter reports the request cost in credits when usage accounting is available
+        stats["cost"] += getattr(usage, "cost", None) or 0.0
+        logger.info(f"[Router] phase={phase}, tier={tier}, model={model}, latency={latency:.2f}s")
+
+    def flush(self):
+        """Write unsaved response cache entries to disk."""
+        if self.response_cache is not None:
+            self.response_cache.flush()
+
+    def log_tier_stats(self):
+        """Log request count, latency, tokens and cost for each model tier."""
+        for tier, stats in self.tier_stats.items():
+            logger.info(
+                f"[Router] tier={tier} ({stats['model']}): requests={stats['requests']}, "
+                f"median_latency={statistics.median(stats['latencies']):.2f}s, "
+                f"max_latency={max(stats['latencies']):.2f}s, "
+                f"prompt_tokens={stats['prompt_tokens']}, completion_tokens={stats['completion_tokens']}, "
+                f"cost={stats['cost']:.4f}"
+            )
+
+    def cache_hit_ratio(self):
+        """Fraction of all reported prompt tokens that were read from the prompt cache."""
+        prompt_tokens = sum(s["prompt_tokens"] or 0 for s in self.request_stats)
+        if not prompt_tokens:
+            return 0.0
+        return sum(s["cached_tokens"] for s in self.request_stats) / prompt_tokens
+
+    def _post_completion(self, body, max_retries=2):
+        """
+        Send a pre-serialized chat completion request body.
+        Retries connection errors, rate limits and server errors like the OpenAI client does.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                response = self.http.post("/chat/completions", content=body)
+            except httpx.TransportError as e:
+                if attempt == max_retries:
+                    raise
+                logger.warning(f"[Request] Connection error ({e}), retrying")
+            else:
+                if response.status_code not in (408, 409, 429) and response.status_code < 500:
+                    response.raise_for_status()
+                    return ChatCompletion.construct(**response.json())
+                if attempt == max_retries:
+                    response.raise_for_status()
+                logger.warning(f"[Request] HTTP {response.status_code}, retrying")
+            time.sleep(0.5 * 2 ** attempt)
@@ -0,0 +1,168 @@
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from agent.emulator import Emulator
+from agent.memory_reader import PokemonRedReader
+
+logger = logging.getLogger(__name__)
+
+# Emulator of a search worker process, booted once by the pool initializer
+_worker_emulator = None
+
+
+@dataclass
+class Outcome:
+    """The simulated result of one candidate move sequence."""
+
+    sequence: tuple[int, ...]  # 1-based move slots
+    score: float
+    summary: str
+    transcript: list[str] = field(default_factory=list)
+    state: bytes = b""  # Emulator state at the end of the simulation
+
+
+def _init_worker(rom_path):
+    global _worker_emulator
+    _worker_emulator = Emulator(rom_path, headless=True)
+    _worker_emulator.pyboy.set_emulation_speed(0)
+
+
+def _simulate_in_worker(state, sequence, max_presses):
+    return simulate(_worker_emulator, state, sequence, max_presses)
+
+
+def score_outcome(start, emulator):
+    """
+    Score the end of a simulation from decoded HP and faint state: enemy HP taken
+    minus own HP lost (as fractions of max HP), with a bonus for defeating the
+    enemy and a larger penalty for fainting.
+
+    Args:
+        start: BattleState before the sequence
+        emulator: Emulator at the end of the sequence
+
+    Returns:
+        tuple[float, str]: The score and a short description of the outcome
+    """
+    end = emulator.get_battle_state()
+    if end is not None:
+        player_hp = end.player.current_hp
+    else:
+        # The party struct is only updated from the battle struct when the battle ends
+        reader = PokemonRedReader(emulator.pyboy.memory)
+        player_hp = reader.read_party_pokemon()[reader.read_active_pokemon_index()].current_hp
+    player_fainted = player_hp == 0
+    if end is None:
+        # The battle ended: with a move sequence that means one side fainted
+        enemy_hp = 0 if not player_fainted else start.enemy.current_hp
+    elif end.enemy.species_id != start.enemy.species_id:
+        enemy_hp = 0  # The trainer sent out the next Pokemon
+    else:
+        enemy_hp = end.enemy.current_hp
+    enemy_fainted = enemy_hp == 0
+
+    score = (start.enemy.current_hp - enemy_hp) / max(start.enemy.max_hp, 1)
+    score -= (start.player.current_hp - player_hp) / max(start.player.max_hp, 1)
+    score += 1.0 if enemy_fainted else 0.0
+    score -= 2.0 if player_fainted else 0.0
+    summary = (
+        f"enemy HP {start.enemy.current_hp}->{enemy_hp}{' (fainted)' if enemy_fainted else ''}, "
+        f"own HP {start.player.current_hp}->{player_hp}{' (fainted)' if player_fainted else ''}"
+    )
+    return score, summary
+
+
+def simulate(emulator, state, sequence, max_presses=40):
+    """
+    Restore a state and play a move sequence on an emulator, one move per turn,
+    advancing the battle text after each move.
+
+    Returns:
+        Outcome: The scored result, including the final emulator state
+    """
+    emulator.load_state_bytes(state)
+    start = emulator.get_battle_state()
+    transcript = []
+    for slot in sequence:
+        if not emulator.is_battle_menu_open():
+            break
+        try:
+            emulator.use_move(slot)
+        except ValueError as e:
+            transcript.append(f"[{e}]")
+            break
+        lines, _, _ = emulator.advance_dialog(max_presses)
+        transcript.extend(lines)
+    score, summary = score_outcome(start, emulator)
+    return Outcome(tuple(sequence), score, summary, transcript, emulator.save_state_bytes())
+
+
+class LookaheadSearch:
+    """
+    Battle lookahead by forking savestates.
+
+    The current state is saved into memory and every candidate move sequence
+    is simulated from it on a pool of headless emulator processes, so wall-clock
+    time scales with the number of cores. The game's random number generator is
+    part of the state, so an outcome is exactly what happens when the same moves
+    are chosen; committing a sequence loads its final state.
+    """
+
+    def __init__(self, rom_path, workers=None, depth=2, max_candidates=16, max_presses=40):
+        self.rom_path = rom_path
+        self.workers = workers
+        self.depth = depth
+        self.max_candidates = max_candidates
+        self.max_presses = max_presses
+        self.executor = None
+
+    def _get_executor(self):
+        # Workers boot their emulators once and are reused by later searches
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.rom_path,)
+            )
+        return self.executor
+
+    def candidates(self, battle_state, depth=None):
+        """Return the move sequences to simulate: all orderings of moves with PP, up to max_candidates."""
+        slots = [i + 1 for i, pp in enumerate(battle_state.player_moves.pp) if pp > 0]
+        return list(itertools.islice(itertools.product(slots, repeat=depth or self.depth), self.max_candidates))
+
+    def search(self, emulator, depth=None):
+        """
+        Simulate every candidate from the emulator's current state.
+
+        Returns:
+            list[Outcome]: Outcomes sorted from best to worst
+
+        Raises:
+            ValueError: If the battle menu is not open or there is no move to use
+        """
+        if not emulator.is_battle_menu_open():
+            raise ValueError("The battle menu (FIGHT/PKMN/ITEM/RUN) is not open")
+        battle_state = emulator.get_battle_state()
+        candidates = self.candidates(battle_state, depth) if battle_state else []
+        if not candidates:
+            raise ValueError("No move with PP left to search over")
+
+        state = emulator.save_state_bytes()
+        start = time.perf_counter()
+        outcomes = list(self._get_executor().map(
+            _simulate_in_worker,
+            itertools.repeat(state),
+            candidates,
+            itertools.repeat(self.max_presses),
+        ))
+        logger.info(
+            f"[Lookahead] Simulated {len(outcomes)} sequences in {time.perf_counter() - start:.2f}s"
+        )
+        return sorted(outcomes, key=lambda outcome: outcome.score, reverse=True)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -6,6 +6,7 @@ from agent.constants import (
     ITEM_NAMES,
     MapLocation,
     Move,
+    POKEDEX_NUMBERS,
     Pokemon,
     PokemonType,
     StatusCondition,
@@ -31,6 +32,11 @@ class PokemonData:
     trainer_id: int
     nickname: str | None = None
     experience: int | None = None
+    # Battle stats, only decoded for the Pokemon currently in battle
+    attack: int | None = None
+    defense: int | None = None
+    speed: int | None = None
+    special: int | None = None
     
     @property
     def is_asleep(self) -> bool:
@@ -294,6 +300,60 @@ class PokemonRedReader:
 
         return party
 
+    def read_battle_pokemon(self, enemy: bool = False) -> PokemonData | None:
+        """Read the player's (wBattleMon) or the enemy's (wEnemyMon) Pokemon in the current battle"""
+        if not self.read_battle_type():
+            return None
+        addr, nickname_addr = (0xCFE5, 0xCFDA) if enemy else (0xD014, 0xD009)
+        try:
+            species_name = Pokemon(self.memory[addr]).name.replace("_", " ")
+        except ValueError:
+            return None
+
+        moves = []
+        move_pp = []
+        for j in range(4):
+            move_id = self.memory[addr + 8 + j]
+            if move_id != 0:
+                moves.append(Move(move_id).name.replace("_", " "))
+                # The top two bits count PP Ups
+                move_pp.append(self.memory[addr + 0x19 + j] & 0x3F)
+
+        type1 = PokemonType(self.memory[addr + 5])
+        type2 = PokemonType(self.memory[addr + 6])
+
+        def word(offset):
+            return (self.memory[addr + offset] << 8) + self.memory[addr + offset + 1]
+
+        return PokemonData(
+            species_id=self.memory[addr],
+            species_name=species_name,
+            current_hp=word(1),
+            max_hp=word(0x0F),
+            level=self.memory[addr + 0x0E],
+            status=StatusCondition(self.memory[addr + 4]),
+            type1=type1,
+            type2=None if type1 == type2 else type2,
+            moves=moves,
+            move_pp=move_pp,
+            trainer_id=0,
+            nickname=self._convert_text(self.memory[nickname_addr : nickname_addr + 11]),
+            attack=word(0x11),
+            defense=word(0x13),
+            speed=word(0x15),
+            special=word(0x17),
+        )
+
+    def read_move_data(self, move_id: int) -> tuple[int, int, PokemonType, int]:
+        """Read a move's (effect, power, type, accuracy out of 255) from the move table in ROM bank 0x0E"""
+        addr = 0x4000 + (move_id - 1) * 6  # 6 bytes per move: animation, effect, power, type, accuracy, PP
+        return (
+            self.memory[0x0E, addr + 1],
+            self.memory[0x0E, addr + 2],
+            PokemonType(self.memory[0x0E, addr + 3]),
+            self.memory[0x0E, addr + 4],
+        )
+
     def read_game_time(self) -> tuple[int, int, int]:
         """Read game time as (hours, minutes, seconds)"""
         hours = (self.memory[0xDA40] << 8) + self.memory[0xDA41]
@@ -301,9 +361,13 @@ class PokemonRedReader:
         seconds = self.memory[0xDA44]
         return (hours, minutes, seconds)
 
+    def read_map_id(self) -> int:
+        """Read the current map ID"""
+        return self.memory[0xD35E]
+
     def read_location(self) -> str:
         """Read current location name"""
-        map_id = self.memory[0xD35E]
+        map_id = self.read_map_id()
         return MapLocation(map_id).name.replace("_", " ")
 
     def read_tileset(self) -> str:
@@ -350,6 +414,49 @@ class PokemonRedReader:
 
         return items
 
+    def read_battle_type(self) -> int:
+        """Read the battle type: 0 = not in battle, 1 = wild, 2 = trainer, 0xFF = lost battle"""
+        return self.memory[0xD057]
+
+    def read_tilemap(self) -> list[int]:
+        """Read the 20x18 tile buffer of the screen (C3A0 to C507), row by row"""
+        return [self.memory[addr] for addr in range(0xC3A0, 0xC508)]
+
+    def is_text_box_open(self) -> bool:
+        """Check if the standard text box (bottom 6 rows of the screen) is drawn"""
+        # ┌ (0x79) at row 12, column 0 and ┘ (0x7E) at row 17, column 19
+        return self.memory[0xC3A0 + 12 * 20] == 0x79 and self.memory[0xC3A0 + 17 * 20 + 19] == 0x7E
+
+    def has_menu_cursor(self) -> bool:
+        """Check if an active menu cursor (▶, 0xED) is on screen, e.g. a YES/NO box, a menu or name entry"""
+        return 0xED in self.read_tilemap()
+
+    def read_menu_cursor(self) -> tuple[int, int, int]:
+        """Read the active menu as (current item, max item, x of the top item) from wCurrentMenuItem, wMaxMenuItem and wTopMenuItemX"""
+        return (self.memory[0xCC26], self.memory[0xCC28], self.memory[0xCC25])
+
+    def read_list_scroll_offset(self) -> int:
+        """Read how far a scrolling list menu (bag, PC box) is scrolled down"""
+        return self.memory[0xCC36]
+
+    def read_active_pokemon_index(self) -> int:
+        """Read the party index of the Pokemon currently in battle"""
+        return self.memory[0xCC2F]
+
+    def has_pokedex(self) -> bool:
+        """Check if the player has received the Pokedex (adds an entry to the start menu)"""
+        return bool(self.memory[0xD74B] & 0x20)
+
+    def read_naming_screen_case(self) -> str | None:
+        """Return "upper" or "lower" for the letters shown on the name-entry screen, or None if it is not open"""
+        # The bottom entry offers the other case
+        text = self.read_dialog()
+        if "UPPER CASE" in text:
+            return "lower"
+        if "lower case" in text:
+            return "upper"
+        return None
+
     def read_dialog(self) -> str:
         """Read any dialog text currently on screen by scanning the tilemap buffer"""
         # Tilemap buffer is from C3A0 to C507
@@ -452,3 +559,11 @@ class PokemonRedReader:
             # Count set bits in this byte
             caught_count += bin(byte).count("1")
         return caught_count
+
+    def is_species_owned(self, species_id: int) -> bool:
+        """Check the Pokedex owned flag of a species, given by its internal species ID"""
+        try:
+            number = POKEDEX_NUMBERS[Pokemon(species_id).name]
+        except (ValueError, KeyError):
+            return False
+        return bool(self.memory[0xD2F7 + (number - 1) // 8] & (1 << ((number - 1) % 8)))
@@ -0,0 +1,368 @@
+from collections import deque
+
+from agent.memory_reader import PokemonRedReader
+from agent.utils import parse_int
+
+# Frames to hold a button and to wait after it inside menus; menus react within a few frames
+MENU_HOLD_FRAMES = 4
+MENU_WAIT_FRAMES = 8
+# The screen counts as settled once the tilemap stayed the same for this many frames
+SETTLE_STABLE_FRAMES = 8
+SETTLE_MAX_FRAMES = 240
+
+# Battle menu options as (column button, row)
+BATTLE_MENU_OPTIONS = {
+    "FIGHT": ("left", 0),
+    "ITEM": ("left", 1),
+    "PKMN": ("right", 0),
+    "RUN": ("right", 1),
+}
+
+# Name-entry keyboard, row by row (9 columns); row 5 is the single case switch entry
+NAME_KEYBOARD_ROWS = {
+    "upper": ["ABCDEFGHI", "JKLMNOPQR", "STUVWXYZ "],
+    "lower": ["abcdefghi", "jklmnopqr", "stuvwxyz "],
+}
+# The last entries of the symbol rows (PK, MN, ED) cannot be typed from text
+NAME_KEYBOARD_SYMBOLS = ["×():;[]", "-?!♂♀/.,"]
+NAME_KEYBOARD_COLUMNS = 9
+NAME_KEYBOARD_CASE_ROW = 5
+MAX_NAME_LENGTH = 10
+
+
+def _keyboard_positions():
+    """Map each character to its (case or None, row, column) on the name-entry keyboard."""
+    positions = {}
+    for case, rows in NAME_KEYBOARD_ROWS.items():
+        for row, letters in enumerate(rows):
+            for col, char in enumerate(letters):
+                positions[char] = (None if char == " " else case, row, col)
+    for row, symbols in enumerate(NAME_KEYBOARD_SYMBOLS, start=len(NAME_KEYBOARD_ROWS["upper"])):
+        for col, char in enumerate(symbols):
+            positions[char] = (None, row, col)
+    return positions
+
+
+NAME_KEYBOARD_POSITIONS = _keyboard_positions()
+
+
+def _keyboard_moves(state):
+    """Yield (button, next state) for every input from a (case, row, column) keyboard state."""
+    case, row, col = state
+    # The cursor wraps around vertically through the case row and horizontally within a row
+    yield "up", (case, row - 1 if row else NAME_KEYBOARD_CASE_ROW, col)
+    if row == NAME_KEYBOARD_CASE_ROW:
+        yield "down", (case, 0, col)
+    elif row == NAME_KEYBOARD_CASE_ROW - 1:
+        # Moving onto the case row puts the cursor in the first column
+        yield "down", (case, NAME_KEYBOARD_CASE_ROW, 0)
+    else:
+        yield "down", (case, row + 1, col)
+    if row != NAME_KEYBOARD_CASE_ROW:
+        yield "left", (case, row, (col - 1) % NAME_KEYBOARD_COLUMNS)
+        yield "right", (case, row, (col + 1) % NAME_KEYBOARD_COLUMNS)
+    yield "select", ("lower" if case == "upper" else "upper", row, col)
+
+
+def plan_name_entry(text, start):
+    """
+    Compute the shortest button sequence that types a string on the name-entry keyboard.
+
+    Args:
+        text (str): The name to type
+        start (tuple[str, int, int]): Current (case, row, column) of the keyboard cursor
+
+    Returns:
+        tuple[list[str], tuple[str, int, int]]: The buttons to press and the final cursor state
+
+    Raises:
+        ValueError: If the text is too long or contains a character that cannot be typed
+    """
+    if not text or len(text) > MAX_NAME_LENGTH:
+        raise ValueError(f"Names must be 1 to {MAX_NAME_LENGTH} characters long")
+    missing = sorted({char for char in text if char not in NAME_KEYBOARD_POSITIONS})
+    if missing:
+        raise ValueError(f"Cannot type {''.join(missing)!r} on the name-entry keyboard")
+
+    buttons = []
+    state = start
+    for char in text:
+        case, row, col = NAME_KEYBOARD_POSITIONS[char]
+        # Breadth-first search over the 108 cursor states for the nearest one on the character
+        previous = {state: None}
+        queue = deque([state])
+        while queue:
+            current = queue.popleft()
+            if current[1:] == (row, col) and case in (None, current[0]):
+                break
+            for button, following in _keyboard_moves(current):
+                if following not in previous:
+                    previous[following] = (current, button)
+                    queue.append(following)
+        path = []
+        state = current
+        while previous[current] is not None:
+            current, button = previous[current]
+            path.append(button)
+        buttons += reversed(path)
+        buttons.append("a")
+    return buttons, state
+
+
+def battle_menu_open(reader):
+    """Check from memory if the battle menu (FIGHT/PKMN/ITEM/RUN) is waiting for input."""
+    return bool(reader.read_battle_type()) and reader.has_menu_cursor() and "FIGHT" in reader.read_dialog()
+
+
+class MenuNavigator:
+    """
+    Compiles high-level menu intents (use an item, switch Pokemon, use a move,
+    type a name) into button sequences.
+
+    Every step reads the cursor position and menu state from memory, moves the
+    cursor with a single compiled input schedule and checks that it landed on
+    the intended entry before confirming, so an intent either completes or
+    stops with an error describing where it got stuck.
+    """
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.pyboy = emulator.pyboy
+        self.reader = PokemonRedReader(self.pyboy.memory)
+
+    def _press(self, button, settle=True):
+        """Press a button briefly, then optionally wait for the screen to settle."""
+        schedule = self.emulator.compile_schedule(
+            [{"button": button, "hold_frames": MENU_HOLD_FRAMES, "wait_frames": MENU_WAIT_FRAMES}]
+        )
+        self.emulator.execute_schedule(schedule)
+        if settle:
+            self._settle()
+
+    def _settle(self):
+        """Run frames until the tilemap stops changing (menus drawn, text printed)."""
+        tilemap = self.reader.read_tilemap()
+        stable = 0
+        for _ in range(SETTLE_MAX_FRAMES):
+            self.pyboy.tick()
+            current = self.reader.read_tilemap()
+            stable = stable + 1 if current == tilemap else 0
+            if stable >= SETTLE_STABLE_FRAMES:
+                return
+            tilemap = current
+
+    def _cursor_index(self, scrolling):
+        current, _, _ = self.reader.read_menu_cursor()
+        return current + (self.reader.read_list_scroll_offset() if scrolling else 0)
+
+    def _move_cursor(self, target, scrolling=False, what="entry"):
+        """
+        Move the menu cursor to an entry and verify it got there.
+
+        Args:
+            target (int): Index of the entry
+            scrolling (bool): Whether the menu is a scrolling list (index includes the scroll offset)
+            what (str): Description of the entry for error messages
+
+        Raises:
+            ValueError: If the cursor does not reach the entry
+        """
+        # Lists may stop scrolling early or wrap, so re-read and correct a couple of times
+        for _ in range(3):
+            delta = target - self._cursor_index(scrolling)
+            if delta == 0:
+                return
+            schedule = self.emulator.compile_schedule([{
+                "button": "down" if delta > 0 else "up",
+                "hold_frames": MENU_HOLD_FRAMES,
+                "repeat": abs(delta),
+                "wait_frames": MENU_WAIT_FRAMES,
+            }])
+            self.emulator.execute_schedule(schedule)
+        if self._cursor_index(scrolling) != target:
+            raise ValueError(f"Could not move the cursor to {what} (cursor at {self._cursor_index(scrolling)}, wanted {target})")
+
+    def is_battle_menu_open(self):
+        """Check if the battle menu (FIGHT/PKMN/ITEM/RUN) is waiting for input."""
+        return battle_menu_open(self.reader)
+
+    def _require_battle_menu(self):
+        if not self.reader.read_battle_type():
+            raise ValueError("Not in a battle")
+        if not self.is_battle_menu_open():
+            raise ValueError("The battle menu (FIGHT/PKMN/ITEM/RUN) is not open; finish the current text first")
+
+    def _battle_menu(self, option):
+        """Select an option in the battle menu."""
+        column, row = BATTLE_MENU_OPTIONS[option]
+        self._press(column, settle=False)
+        self._move_cursor(row, what=option)
+        self._press("a")
+
+    def _select_party_slot(self, slot):
+        """Select a 1-based slot in the party menu that is on screen."""
+        party_size = self.reader.read_party_size()
+        _, max_item, _ = self.reader.read_menu_cursor()
+        if max_item != party_size - 1:
+            raise ValueError("The party menu did not open")
+        self._move_cursor(slot - 1, what=f"party slot {slot}")
+        self._press("a")
+
+    def _check_party_slot(self, slot):
+        party = self.reader.read_party_pokemon()
+        if not 1 <= slot <= len(party):
+            raise ValueError(f"Invalid party slot {slot}: the party has {len(party)} Pokemon")
+        return party[slot - 1]
+
+    def type_name(self, text, finish=True):
+        """
+        Type a name on the name-entry screen with one compiled input schedule.
+
+        Args:
+            text (str): The name to type (the game keeps at most 7 characters for
+                the player and rival, 10 for Pokemon)
+            finish (bool): Whether to confirm the name with START afterwards
+
+        Returns:
+            str: Description of the result
+        """
+        if not isinstance(text, str):
+            raise ValueError(f"text must be a string, got {text!r}")
+        case = self.reader.read_naming_screen_case()
+        if case is None:
+            raise ValueError("The name-entry screen is not open")
+        # The naming screen keeps the cursor row (1-6) in wCurrentMenuItem and its x (1, 3, ..., 17) in wTopMenuItemX
+        current, _, x = self.reader.read_menu_cursor()
+        start = (case, current - 1, (x - 1) // 2)
+        buttons, final = plan_name_entry(text, start)
+        if finish:
+            buttons.append("start")
+
+        schedule = self.emulator.compile_schedule([
+            {"button": button, "hold_frames": MENU_HOLD_FRAMES, "wait_frames": MENU_WAIT_FRAMES}
+            for button in buttons
+        ])
+        self.emulator.execute_schedule(schedule)
+        self._settle()
+
+        result = f"Typed {text!r} with {len(buttons)} button presses"
+        if not finish:
+            current, _, x = self.reader.read_menu_cursor()
+            if (self.reader.read_naming_screen_case(), current - 1, (x - 1) // 2) != final:
+                result += " (the cursor did not end where expected; check the name on screen)"
+        return result
+
+    def use_move(self, slot):
+        """
+        Use the move in the given slot (1-4) of the active Pokemon from the battle menu.
+
+        Returns:
+            str: Description of the result
+        """
+        slot = parse_int(slot, "slot")
+        self._require_battle_menu()
+        party = self.reader.read_party_pokemon()
+        pokemon = party[self.reader.read_active_pokemon_index()]
+        if not 1 <= slot <= len(pokemon.moves):
+            raise ValueError(f"Invalid move slot {slot}: {pokemon.nickname} knows {len(pokemon.moves)} moves")
+        move = pokemon.moves[slot - 1]
+        if pokemon.move_pp[slot - 1] == 0:
+            raise ValueError(f"{move} has no PP left")
+
+        self._battle_menu("FIGHT")
+        if "TYPE" not in self.reader.read_dialog():
+            raise ValueError("The move menu did not open")
+        self._move_cursor(slot - 1, what=move)
+        self._press("a")
+        if "TYPE" in self.reader.read_dialog():
+            raise ValueError(f"{move} could not be selected")
+        return f"Used {move}"
+
+    def run_from_battle(self):
+        """
+        Select RUN in the battle menu.
+
+        Returns:
+            str: Description of the result
+        """
+        self._require_battle_menu()
+        self._battle_menu("RUN")
+        return "Tried to run away"
+
+    def switch_pokemon(self, slot):
+        """
+        Switch the active Pokemon in battle to the one in the given party slot (1-6).
+
+        Returns:
+            str: Description of the result
+        """
+        slot = parse_int(slot, "slot")
+        self._require_battle_menu()
+        pokemon = self._check_party_slot(slot)
+        if slot - 1 == self.reader.read_active_pokemon_index():
+            raise ValueError(f"{pokemon.nickname} is already in battle")
+        if pokemon.current_hp == 0:
+            raise ValueError(f"{pokemon.nickname} has fainted")
+
+        self._battle_menu("PKMN")
+        self._select_party_slot(slot)
+        # The submenu opens with the cursor on SWITCH
+        self._move_cursor(0, what="SWITCH")
+        self._press("a")
+
+        for _ in range(SETTLE_MAX_FRAMES):
+            if self.reader.read_active_pokemon_index() == slot - 1:
+                return f"Switched to {pokemon.nickname}"
+            self.pyboy.tick()
+        return f"Selected {pokemon.nickname} to switch in, but the switch could not be confirmed yet"
+
+    def use_item(self, item, slot=None):
+        """
+        Use an item from the bag, in battle or from the start menu, optionally
+        on the Pokemon in the given party slot (1-6).
+
+        Returns:
+            str: Description of the result
+        """
+        if not isinstance(item, str) or not item:
+            raise ValueError(f"item must be an item name, got {item!r}")
+        if slot is not None:
+            slot = parse_int(slot, "slot")
+        items = self.reader.read_items()
+        names = [name.upper() for name, _ in items]
+        if item.upper() not in names:
+            raise ValueError(f"{item} is not in the bag")
+        index = names.index(item.upper())
+        name, quantity = items[index]
+        if slot is not None:
+            target = self._check_party_slot(slot)
+
+        in_battle = bool(self.reader.read_battle_type())
+        if in_battle:
+            self._require_battle_menu()
+            self._battle_menu("ITEM")
+        else:
+            if self.reader.is_text_box_open() or self.reader.has_menu_cursor():
+                raise ValueError("Close the current text or menu first")
+            self._press("start")
+            if not self.reader.has_menu_cursor():
+                raise ValueError("The start menu did not open")
+            # POKéDEX, POKéMON, ITEM, ... (no POKéDEX entry before receiving it)
+            self._move_cursor(2 if self.reader.has_pokedex() else 1, what="ITEM")
+            self._press("a")
+
+        self._move_cursor(index, scrolling=True, what=name)
+        self._press("a")
+        if not in_battle:
+            # USE / TOSS submenu
+            self._move_cursor(0, what="USE")
+            self._press("a")
+
+        if slot is not None:
+            self._select_party_slot(slot)
+
+        remaining = dict(self.reader.read_items()).get(name, 0)
+        used_on = f" on {target.nickname}" if slot is not None else ""
+        if remaining < quantity:
+            return f"Used {name}{used_on} ({name} x{quantity} -> x{remaining})"
+        return f"Selected {name}{used_on}, but it was not consumed (it may not have had an effect)"
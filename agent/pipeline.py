@@ -0,0 +1,119 @@
+import logging
+import queue
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+
+class StageTimer:
+    """
+    Wall-clock breakdown of an agent step by stage.
+
+    Stages timed on the main thread make up the critical path of a step; stages
+    timed on worker threads (e.g. screenshot encoding) overlap with it. The
+    summary reports both, so the effect of moving work off the main thread shows
+    up as a shorter critical path rather than less total work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._counts = {}
+        self._background = set()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._totals[name] = self._totals.get(name, 0.0) + seconds
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if threading.current_thread() is not threading.main_thread():
+                self._background.add(name)
+
+    def summary(self):
+        """
+        Returns:
+            dict: stage -> {"calls", "total_ms", "mean_ms", "background"}
+        """
+        with self._lock:
+            return {
+                name: {
+                    "calls": self._counts[name],
+                    "total_ms": total * 1000,
+                    "mean_ms": total * 1000 / self._counts[name],
+                    "background": name in self._background,
+                }
+                for name, total in self._totals.items()
+            }
+
+    def format(self):
+        """Render the summary on one line, critical-path stages first, as mean ms per call."""
+        stages = sorted(self.summary().items(), key=lambda item: (item[1]["background"], -item[1]["total_ms"]))
+        return ", ".join(
+            f"{name}{'*' if stats['background'] else ''}={stats['mean_ms']:.1f}ms" for name, stats in stages
+        ) + " (* = off the main thread)"
+
+
+class AllocationTracer:
+    """
+    Peak Python allocations per agent step, measured with tracemalloc. Tracing
+    slows every allocation down, so it is only meant for comparing code paths.
+    """
+
+    def __init__(self):
+        tracemalloc.start()
+        self.steps = 0
+        self.total_peak = 0
+        self.max_peak = 0
+        self._base = 0
+
+    def begin(self):
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+
+    def end(self):
+        peak = tracemalloc.get_traced_memory()[1] - self._base
+        self.steps += 1
+        self.total_peak += peak
+        self.max_peak = max(self.max_peak, peak)
+
+    def format(self):
+        mean = self.total_peak / self.steps if self.steps else 0
+        return f"steps={self.steps}, mean_peak_kb={mean / 1024:.0f}, max_peak_kb={self.max_peak / 1024:.0f}"
+
+    def stop(self):
+        tracemalloc.stop()
+
+
+def start_background_logging():
+    """
+    Move log output to a listener thread: the root logger's handlers are replaced
+    by a QueueHandler, so logging calls only format the record and enqueue it.
+
+    Returns:
+        QueueListener: Pass to stop_background_logging, or None if already running
+    """
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers or any(isinstance(handler, QueueHandler) for handler in handlers):
+        return None
+    listener = QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(listener.queue)]
+    listener.start()
+    return listener
+
+
+def stop_background_logging(listener):
+    """Flush queued records and restore the original handlers."""
+    if listener is None:
+        return
+    listener.stop()
+    logging.getLogger().handlers = list(listener.handlers)
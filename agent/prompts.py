@@ -6,13 +6,21 @@ Before each action, explain your reasoning briefly, then use the emulator tool t
 
 The conversation history may occasionally be summarized to save context space. If you see a message labeled "CONVERSATION HISTORY SUMMARY", this contains the key information about your progress so far. Use this information to maintain continuity in your gameplay."""
 
-SUMMARY_PROMPT = """I need you to create a detailed summary of our conversation history up to this point. This summary will replace the full conversation history to manage the context window.
+SUMMARY_PROMPT = """I need you to update the summary of our playthrough so far. This summary replaces the conversation history to manage the context window.
 
-Please include:
+Below you will find the long-term summary of the whole playthrough, the summary of the current chapter, and a text transcript of everything that happened since the chapter summary was written (your reasoning, your actions, and the changes in game state they caused).
+
+Fold the new events into the chapter summary. Please include:
 1. Key game events and milestones you've reached
 2. Important decisions you've made
 3. Current objectives or goals you're working toward
 4. Your current location and Pokémon team status
 5. Any strategies or plans you've mentioned
 
-The summary should be comprehensive enough that you can continue gameplay without losing important context about what has happened so far."""
+The summary should be comprehensive enough that you can continue gameplay without losing important context about what has happened so far. Reply with the updated chapter summary only."""
+
+LONG_TERM_SUMMARY_PROMPT = """I need you to fold a finished chapter of our playthrough into the long-term summary.
+
+Below you will find the current long-term summary and the summary of the chapter that just ended. Merge them into a single concise long-term summary that keeps the milestones reached, the team and items that matter, and the current objectives. Drop details that no longer matter for continuing the game.
+
+Reply with the updated long-term summary only."""
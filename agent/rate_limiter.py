@@ -0,0 +1,82 @@
+import multiprocessing
+import time
+
+
+class TokenBucketRateLimiter:
+    """
+    Request and token rate limiter shared by agent processes.
+
+    Two token buckets (requests per minute and tokens per minute) live in shared
+    memory behind one lock, so any number of processes started with the same
+    limiter draw from the same budget. A request reserves its estimated prompt
+    tokens up front; `settle` corrects the bucket with the actual usage once the
+    response arrives. A limit of None disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, context=multiprocessing):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = context.Lock()
+        self._requests = context.Value("d", requests_per_minute or 0.0, lock=False)
+        self._tokens = context.Value("d", tokens_per_minute or 0.0, lock=False)
+        # CLOCK_MONOTONIC is system-wide, so the timestamp is valid in every process
+        self._updated = context.Value("d", time.monotonic(), lock=False)
+        self._acquired = context.Value("q", 0, lock=False)
+        self._wait_seconds = context.Value("d", 0.0, lock=False)
+
+    def _refill(self, now):
+        elapsed = now - self._updated.value
+        self._updated.value = now
+        if self.requests_per_minute:
+            self._requests.value = min(
+                self.requests_per_minute, self._requests.value + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute:
+            self._tokens.value = min(
+                self.tokens_per_minute, self._tokens.value + elapsed * self.tokens_per_minute / 60
+            )
+
+    def acquire(self, tokens=0):
+        """
+        Block until one request with the given number of tokens fits in the budget.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        # A request larger than the whole bucket would never fit
+        tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                request_wait = (
+                    (1 - self._requests.value) * 60 / self.requests_per_minute
+                    if self.requests_per_minute and self._requests.value < 1 else 0.0
+                )
+                token_wait = (
+                    (tokens - self._tokens.value) * 60 / self.tokens_per_minute
+                    if tokens and self._tokens.value < tokens else 0.0
+                )
+                if request_wait <= 0 and token_wait <= 0:
+                    if self.requests_per_minute:
+                        self._requests.value -= 1
+                    self._tokens.value -= tokens
+                    waited = now - start
+                    self._acquired.value += 1
+                    self._wait_seconds.value += waited
+                    return waited
+            time.sleep(min(max(request_wait, token_wait), 5.0))
+
+    def settle(self, reserved_tokens, actual_tokens):
+        """Correct the token bucket once the actual usage of a request is known (may go into debt)."""
+        if not self.tokens_per_minute:
+            return
+        reserved_tokens = min(reserved_tokens, self.tokens_per_minute)
+        with self._lock:
+            self._tokens.value -= actual_tokens - reserved_tokens
+
+    def stats(self):
+        """Return the number of granted requests and the total time callers waited."""
+        with self._lock:
+            return {"requests": self._acquired.value, "wait_seconds": self._wait_seconds.value}
@@ -0,0 +1,103 @@
+import json
+import logging
+import time
+
+from agent.history import FrozenDict, freeze
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RequestBodySerializer:
+    """
+    Builds chat completion request bodies from cached JSON fragments.
+
+    Frozen message records never change, so each one is serialized once and
+    its bytes are reused for as long as it stays in the request. The static
+    prefix (model, sampling parameters, tools) is cached the same way, and a
+    request body is just the concatenation of cached fragments plus the new tail.
+    """
+
+    def __init__(self):
+        # id(record) -> (record, bytes); the record is kept so its id cannot be reused
+        self._fragments = {}
+        self._prefixes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _prefix(self, model, max_tokens, temperature, tools):
+        key = (model, max_tokens, temperature, id(tools) if tools else None)
+        cached = self._prefixes.get(key)
+        if cached is None or cached[0] is not tools:
+            params = {"model": model, "max_tokens": max_tokens, "temperature": temperature}
+            if tools:
+                params["tools"] = tools
+            cached = (tools, _dumps(params)[:-1] + b',"messages":[')
+            self._prefixes[key] = cached
+        return cached[1]
+
+    def _fragment(self, message, fragments):
+        if not isinstance(message, FrozenDict):
+            # Mutable messages may change between requests, so never cache them
+            self.misses += 1
+            return _dumps(message)
+        cached = self._fragments.get(id(message))
+        if cached is None or cached[0] is not message:
+            self.misses += 1
+            cached = (message, _dumps(message))
+        else:
+            self.hits += 1
+        fragments[id(message)] = cached
+        return cached[1]
+
+    def build(self, messages, model, max_tokens, temperature, tools=None):
+        """
+        Serialize a chat completion request.
+
+        Returns:
+            bytes: The JSON request body
+        """
+        fragments = {}
+        body = b"".join((
+            self._prefix(model, max_tokens, temperature, tools),
+            b",".join(self._fragment(message, fragments) for message in messages),
+            b"]}",
+        ))
+        # Only keep fragments of messages that are still part of the request
+        self._fragments = fragments
+        return body
+
+
+if __name__ == "__main__":
+    # Benchmark: serialization time versus history length, json.dumps vs cached fragments
+    image = "A" * 40_000  # roughly the size of a base64 2x upscaled screenshot
+    tools = [{"type": "function", "function": {"name": "press_buttons", "parameters": {}}}]
+
+    def message(i):
+        return freeze({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": f"Here is the current game state ({i}):"},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}},
+            ],
+        })
+
+    print(f"{'messages':>8} {'json.dumps ms':>14} {'cached ms':>10} {'body KB':>8}")
+    for length in (10, 25, 50, 100, 200):
+        history = [message(i) for i in range(length)]
+        serializer = RequestBodySerializer()
+        serializer.build(history[:-1], "model", 1000, 1.0, tools)
+
+        start = time.perf_counter()
+        plain = _dumps({"model": "model", "max_tokens": 1000, "temperature": 1.0, "tools": tools, "messages": history})
+        plain_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        body = serializer.build(history, "model", 1000, 1.0, tools)
+        cached_ms = (time.perf_counter() - start) * 1000
+
+        assert json.loads(body) == json.loads(plain)
+        print(f"{length:>8} {plain_ms:>14.2f} {cached_ms:>10.2f} {len(body) // 1024:>8}")
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    LRU cache of model responses with a TTL, persisted to a JSON file.
+
+    Keys are hashes of the model, the canonical game state and the recent
+    action window, so an exact repeat of a situation (replaying a savestate,
+    looping in a menu) returns the previously chosen tool calls without a
+    request. Meant for deterministic benchmark and regression runs.
+
+    New entries are written to disk every `flush_every` puts and on flush(),
+    not on every put, so the file write stays off the step's critical path.
+    """
+
+    def __init__(self, path, max_entries=5000, ttl=7 * 24 * 3600, flush_every=20):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.entries = OrderedDict()  # key -> (timestamp, message)
+        self.hits = 0
+        self.misses = 0
+        # Puts not yet written to disk
+        self.unsaved = 0
+        self.load()
+
+    @staticmethod
+    def make_key(model, state, recent_actions):
+        """
+        Build a cache key.
+
+        Args:
+            model: The model the request would be sent to
+            state: Canonical game state string
+            recent_actions: List of (tool name, arguments) of the most recent actions
+        """
+        payload = json.dumps([model, state, recent_actions], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def load(self):
+        """Load the cache file, dropping expired entries."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[ResponseCache] Could not read {self.path}: {e}")
+            return
+        now = time.time()
+        for key, timestamp, message in data:
+            if now - timestamp < self.ttl:
+                self.entries[key] = (timestamp, message)
+        logger.info(f"[ResponseCache] Loaded {len(self.entries)} entries from {self.path}")
+
+    def save(self):
+        """Write the cache to disk atomically (temp file and rename)."""
+        # Per-process temp file, so parallel sessions sharing the cache never write the same one
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump([[key, timestamp, message] for key, (timestamp, message) in self.entries.items()], f)
+        os.replace(tmp_path, self.path)
+        self.unsaved = 0
+
+    def flush(self):
+        """Write the cache to disk if it has unsaved entries."""
+        if self.unsaved:
+            self.save()
+
+    def get(self, key):
+        """
+        Return the cached assistant message for a key, or None.
+
+        Returns:
+            dict | None: {"content": str, "tool_calls": [{"name": ..., "arguments": ...}]}
+        """
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, message):
+        """Store an assistant message, evicting the least recently used entries beyond max_entries."""
+        self.entries[key] = (time.time(), message)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.unsaved += 1
+        if self.unsaved >= self.flush_every:
+            self.save()
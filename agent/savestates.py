@@ -0,0 +1,173 @@
+import logging
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_MODES = ("none", "zlib", "delta")
+
+
+@dataclass
+class Snapshot:
+    """One entry of the savestate ring."""
+
+    step: int
+    data: bytes
+    keyframe: bool  # False for delta entries, which are relative to the previous entry
+    size: int  # Uncompressed state size
+
+
+class SavestateRing:
+    """
+    A bounded in-memory ring of recent emulator savestates for rewinding.
+
+    A snapshot is taken every `interval` steps. States are stored raw, zlib
+    compressed, or (mode "delta") as the zlib compressed XOR against the previous
+    snapshot, which is mostly zeros because little of the state changes between
+    steps. Every `keyframe_interval`-th delta entry is stored in full so restoring
+    never replays a long chain. The ring holds at most `capacity` snapshots and
+    `max_bytes` of snapshot data, dropping the oldest first.
+    """
+
+    def __init__(self, capacity=32, interval=1, compression="delta", max_bytes=64 * 1024 * 1024, keyframe_interval=8):
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown compression {compression!r}. Valid: {', '.join(COMPRESSION_MODES)}")
+        self.capacity = capacity
+        self.interval = interval
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.snapshots = deque()
+        self.bytes_used = 0
+        self.steps = 0
+        # The raw state of the newest snapshot, the base of the next delta
+        self._last_state = None
+        self._since_keyframe = 0
+        self.captures = 0
+        self.capture_seconds = 0.0
+        self.max_capture_seconds = 0.0
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def _encode(self, state):
+        if self.compression == "none":
+            return state, True
+        if self.compression == "zlib":
+            return zlib.compress(state, 1), True
+        if (
+            self._last_state is None
+            or len(self._last_state) != len(state)
+            or self._since_keyframe >= self.keyframe_interval
+        ):
+            self._since_keyframe = 0
+            return zlib.compress(state, 1), True
+        self._since_keyframe += 1
+        delta = np.bitwise_xor(np.frombuffer(state, np.uint8), np.frombuffer(self._last_state, np.uint8))
+        return zlib.compress(delta.tobytes(), 1), False
+
+    def _decode(self, index):
+        """Reconstruct the raw state of the snapshot at an index (0 is the oldest)."""
+        start = index
+        while not self.snapshots[start].keyframe:
+            start -= 1
+        snapshot = self.snapshots[start]
+        state = snapshot.data if self.compression == "none" else zlib.decompress(snapshot.data)
+        for snapshot in list(self.snapshots)[start + 1 : index + 1]:
+            delta = np.frombuffer(zlib.decompress(snapshot.data), np.uint8)
+            state = np.bitwise_xor(np.frombuffer(state, np.uint8), delta).tobytes()
+        return state
+
+    def _evict_oldest(self):
+        oldest = self.snapshots[0]
+        if len(self.snapshots) > 1 and not self.snapshots[1].keyframe:
+            # The next entry is a delta against the evicted one, so turn it into a keyframe
+            state = self._decode(1)
+            following = self.snapshots[1]
+            data = zlib.compress(state, 1)
+            self.bytes_used += len(data) - len(following.data)
+            self.snapshots[1] = Snapshot(following.step, data, True, following.size)
+        self.snapshots.popleft()
+        self.bytes_used -= len(oldest.data)
+
+    def capture(self, emulator, step=None):
+        """Snapshot the emulator now, evicting the oldest snapshots beyond the bounds."""
+        start = time.perf_counter()
+        state = emulator.save_state_bytes()
+        data, keyframe = self._encode(state)
+        self.snapshots.append(Snapshot(self.steps if step is None else step, data, keyframe, len(state)))
+        self.bytes_used += len(data)
+        self._last_state = state
+        while len(self.snapshots) > 1 and (len(self.snapshots) > self.capacity or self.bytes_used > self.max_bytes):
+            self._evict_oldest()
+        elapsed = time.perf_counter() - start
+        self.captures += 1
+        self.capture_seconds += elapsed
+        self.max_capture_seconds = max(self.max_capture_seconds, elapsed)
+        logger.debug(
+            f"[Savestates] Captured step {self.snapshots[-1].step}: {len(data)} of {len(state)} bytes "
+            f"in {elapsed * 1000:.2f} ms ({len(self.snapshots)} snapshots, {self.bytes_used} bytes)"
+        )
+
+    def step(self, emulator):
+        """Count an agent step and take a snapshot if it is due. Call before the step's actions run."""
+        if self.steps % self.interval == 0:
+            self.capture(emulator)
+        self.steps += 1
+
+    def rewind(self, emulator, snapshots_back=1):
+        """
+        Restore an earlier snapshot and drop every snapshot after it.
+
+        Args:
+            snapshots_back (int): 1 restores the most recent snapshot, 2 the one before, ...
+
+        Returns:
+            int: The step at which the restored snapshot was taken
+
+        Raises:
+            ValueError: If there are not enough snapshots
+        """
+        if not 1 <= snapshots_back <= len(self.snapshots):
+            raise ValueError(f"Can rewind 1 to {len(self.snapshots)} snapshots, not {snapshots_back}")
+        index = len(self.snapshots) - snapshots_back
+        state = self._decode(index)
+        emulator.load_state_bytes(state)
+        while len(self.snapshots) > index + 1:
+            self.bytes_used -= len(self.snapshots.pop().data)
+        self._last_state = state
+        # Dropped deltas may have been counted, so start a fresh chain with a keyframe
+        self._since_keyframe = self.keyframe_interval
+        return self.snapshots[-1].step
+
+    def rewind_to_step(self, emulator, step):
+        """
+        Restore the newest snapshot taken at or before an agent step.
+
+        Returns:
+            int: The step at which the restored snapshot was taken
+
+        Raises:
+            ValueError: If every snapshot is newer than the step
+        """
+        for snapshots_back, snapshot in enumerate(reversed(self.snapshots), start=1):
+            if snapshot.step <= step:
+                return self.rewind(emulator, snapshots_back)
+        oldest = self.snapshots[0].step if self.snapshots else self.steps
+        raise ValueError(f"No snapshot that old: the oldest is from step {oldest}")
+
+    def stats(self):
+        """Return snapshot count, memory use and capture cost."""
+        raw = sum(snapshot.size for snapshot in self.snapshots)
+        return {
+            "snapshots": len(self.snapshots),
+            "bytes": self.bytes_used,
+            "compression_ratio": raw / self.bytes_used if self.bytes_used else 0.0,
+            "captures": self.captures,
+            "mean_capture_ms": 1000 * self.capture_seconds / self.captures if self.captures else 0.0,
+            "max_capture_ms": 1000 * self.max_capture_seconds,
+        }
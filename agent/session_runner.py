@@ -0,0 +1,171 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+from config import CONTEXT_POLICY, RATE_LIMIT_REQUESTS_PER_MINUTE, RATE_LIMIT_TOKENS_PER_MINUTE
+
+from agent.fork_server import ForkServer
+from agent.rate_limiter import TokenBucketRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def _client_tokens(client):
+    prompt = sum(stats["prompt_tokens"] for stats in client.tier_stats.values())
+    completion = sum(stats["completion_tokens"] for stats in client.tier_stats.values())
+    return prompt, completion
+
+
+def _failed_report(index, error):
+    return {"session": index, "steps": 0, "seconds": 0.0, "prompt_tokens": 0,
+            "completion_tokens": 0, "rate_limit_wait": 0.0, "error": error}
+
+
+def run_session(emulator, index, rom_path, num_steps, max_history, rate_limiter):
+    """
+    Run one headless agent session on an emulator and return its report. Meant
+    to be the target of ForkServer.spawn, which has already restored the
+    session's starting state.
+    """
+    from dotenv import load_dotenv
+
+    from agent.simple_agent import SimpleAgent
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - session {index} - %(name)s - %(levelname)s - %(message)s",
+        force=True,
+    )
+    report = _failed_report(index, None)
+    agent = None
+    start = time.perf_counter()
+    try:
+        agent = SimpleAgent(
+            rom_path=rom_path,
+            headless=True,
+            max_history=max_history,
+            context_policy=CONTEXT_POLICY,
+            rate_limiter=rate_limiter,
+            emulator=emulator,
+        )
+        agent.run(num_steps=num_steps)
+    except Exception as e:
+        logger.error(f"Session {index} failed: {e}")
+        report["error"] = f"{type(e).__name__}: {e}"
+    report["seconds"] = time.perf_counter() - start
+    if agent is not None:
+        report["steps"] = agent.steps_completed
+        for client in (agent.client, agent.summary_client):
+            prompt, completion = _client_tokens(client)
+            report["prompt_tokens"] += prompt
+            report["completion_tokens"] += completion
+            report["rate_limit_wait"] += client.rate_limit_wait
+        try:
+            agent.stop()
+        except Exception as e:
+            logger.error(f"Session {index} failed to stop cleanly: {e}")
+    return report
+
+
+def run_sessions(rom_path, sessions, num_steps, load_state=None, max_history=30,
+                 requests_per_minute=RATE_LIMIT_REQUESTS_PER_MINUTE, tokens_per_minute=RATE_LIMIT_TOKENS_PER_MINUTE):
+    """
+    Run agent sessions in parallel processes that share one rate limiter for
+    OpenRouter requests and tokens. The emulator is booted once in a ForkServer
+    and every session is forked from it, so sessions skip the boot and only
+    restore load_state. Sessions use the forked emulator directly, whatever
+    EMULATOR_SERVER is set to.
+
+    Returns:
+        dict: Aggregated report with a "sessions" list of per-session reports
+    """
+    rate_limiter = TokenBucketRateLimiter(requests_per_minute, tokens_per_minute)
+    server = ForkServer(rom_path)
+    start = time.perf_counter()
+    try:
+        running = [
+            server.spawn(load_state, run_session, index, rom_path, num_steps, max_history, rate_limiter)
+            for index in range(sessions)
+        ]
+        reports = []
+        for index, session in enumerate(running):
+            try:
+                reports.append(session.result())
+            except RuntimeError as e:
+                # The child raised outside run_session or died without reporting (e.g. a crash in the emulator)
+                logger.error(str(e))
+                reports.append(_failed_report(index, str(e).splitlines()[0]))
+    finally:
+        server.stop()
+    wall_seconds = time.perf_counter() - start
+
+    total_steps = sum(report["steps"] for report in reports)
+    return {
+        "sessions": reports,
+        "wall_seconds": wall_seconds,
+        "total_steps": total_steps,
+        "steps_per_second": total_steps / wall_seconds if wall_seconds else 0.0,
+        "prompt_tokens": sum(report["prompt_tokens"] for report in reports),
+        "completion_tokens": sum(report["completion_tokens"] for report in reports),
+        "failures": sum(1 for report in reports if report["error"]),
+        "rate_limiter": rate_limiter.stats(),
+        "boot_seconds": server.boot_seconds,
+    }
+
+
+def format_report(report):
+    """Render an aggregated report as a text table."""
+    lines = [f"{'session':>7} {'steps':>6} {'steps/s':>8} {'prompt tok':>11} {'compl tok':>10} {'rl wait s':>10}  error"]
+    for session in report["sessions"]:
+        rate = session["steps"] / session["seconds"] if session["seconds"] else 0.0
+        lines.append(
+            f"{session['session']:>7} {session['steps']:>6} {rate:>8.3f} {session['prompt_tokens']:>11} "
+            f"{session['completion_tokens']:>10} {session['rate_limit_wait']:>10.1f}  {session['error'] or ''}"
+        )
+    lines.append(
+        f"total: {report['total_steps']} steps in {report['wall_seconds']:.1f}s "
+        f"({report['steps_per_second']:.3f} steps/s), {report['prompt_tokens']} prompt + "
+        f"{report['completion_tokens']} completion tokens, {report['failures']} failed sessions, "
+        f"{report['rate_limiter']['requests']} rate-limited requests waited "
+        f"{report['rate_limiter']['wait_seconds']:.1f}s in total, emulator booted once in "
+        f"{report['boot_seconds']:.1f}s"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several agent sessions in parallel with a shared rate limit")
+    parser.add_argument("--rom", type=str, default="pokemon.gb", help="Path to the Pokemon ROM file")
+    parser.add_argument("--sessions", type=int, default=os.cpu_count() or 1, help="Number of parallel sessions")
+    parser.add_argument("--steps", type=int, default=10, help="Number of agent steps per session")
+    parser.add_argument("--max-history", type=int, default=30, help="Maximum number of messages in history before summarization")
+    parser.add_argument("--load-state", type=str, default=None, help="Path to a saved state to start every session from")
+    parser.add_argument("--state-query", type=str, default=None, help="Start from the first cataloged savestate matching a query")
+    parser.add_argument("--requests-per-minute", type=float, default=RATE_LIMIT_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=float, default=RATE_LIMIT_TOKENS_PER_MINUTE)
+    parser.add_argument("--report", type=str, default=None, help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    load_state = args.load_state
+    if args.state_query:
+        from config import STATE_CATALOG_DIR, STATE_CATALOG_PATH
+
+        from agent.state_catalog import StateCatalog
+
+        catalog = StateCatalog(STATE_CATALOG_PATH, STATE_CATALOG_DIR)
+        load_state = catalog.find(args.state_query)
+        catalog.close()
+
+    report = run_sessions(
+        os.path.abspath(args.rom), args.sessions, args.steps, load_state, args.max_history,
+        args.requests_per_minute, args.tokens_per_minute,
+    )
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
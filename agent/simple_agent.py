@@ -1,23 +1,69 @@
-import copy
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from config import MAX_TOKENS, MODEL_NAME, TEMPERATURE, SUMMARY_TEMPERATURE
+from config import (
+    BACKGROUND_LOGGING,
+    BACKGROUND_SUMMARIZATION,
+    BATTLE_AUTOPILOT,
+    BATTLE_AUTOPILOT_LEVEL_MARGIN,
+    BATTLE_AUTOPILOT_LOW_HP,
+    BATTLE_AUTOPILOT_MAX_ACTIONS,
+    BATTLE_AUTOPILOT_MAX_TURNS,
+    CONTEXT_POLICY,
+    DIALOG_AUTOPILOT,
+    DIALOG_AUTOPILOT_MAX_PRESSES,
+    EMULATOR_SERVER,
+    LOOKAHEAD_DEPTH,
+    LOOKAHEAD_MAX_CANDIDATES,
+    LOOKAHEAD_WORKERS,
+    MAX_TOKENS,
+    MODEL_NAME,
+    PIPELINE_WORKERS,
+    RESPONSE_CACHE_ACTION_WINDOW,
+    RESPONSE_CACHE_ENABLED,
+    SAVESTATE_RING_COMPRESSION,
+    SAVESTATE_RING_INTERVAL,
+    SAVESTATE_RING_MAX_BYTES,
+    SAVESTATE_RING_SIZE,
+    SCREENSHOT_CACHE_SIZE,
+    SCREENSHOT_FORMAT,
+    SCREENSHOT_PNG_COMPRESS_LEVEL,
+    SCREENSHOT_QUALITY,
+    STAGE_TIMING_LOG_EVERY,
+    TEMPERATURE,
+    TRACE_ALLOCATIONS,
+)
 
+from agent.battle import BattlePolicy
+from agent.blob_store import BlobStore
+from agent.context_policy import get_context_policy
 from agent.emulator import Emulator
+from agent.emulator_server import RemoteEmulator
+from agent.history import MessageHistory, freeze
 from agent.llm_client import LLMClient
-from agent.prompts import SYSTEM_PROMPT, SUMMARY_PROMPT
+from agent.lookahead import LookaheadSearch
+from agent.pipeline import AllocationTracer, StageTimer, start_background_logging, stop_background_logging
+from agent.prompts import SYSTEM_PROMPT
+from agent.savestates import SavestateRing
+from agent.screenshot_encoder import ScreenshotEncoder
+from agent.summarizer import IncrementalSummarizer
+from agent.tokens import get_history_token_budget
 from agent.tools import AVAILABLE_TOOLS
-from agent.utils import get_screenshot_base64
+from agent.utils import parse_int
 
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shared by every request so its cache annotation and serialization are reused
+SYSTEM_MESSAGE = freeze({"role": "system", "content": SYSTEM_PROMPT})
+
 
 class SimpleAgent:
-    def __init__(self, rom_path, headless=True, sound=False, max_history=60, load_state=None):
+    def __init__(self, rom_path, headless=True, sound=False, max_history=60, load_state=None, context_policy=CONTEXT_POLICY, rate_limiter=None, emulator=None):
         """Initialize the simple agent.
 
         Args:
@@ -25,13 +71,53 @@ class SimpleAgent:
             headless: Whether to run without display
             sound: Whether to enable sound
             max_history: Maximum number of messages in history before summarization
+            load_state: Path to a saved state to load
+            context_policy: Name of the policy for older screenshots (see agent.context_policy)
+            rate_limiter: Optional TokenBucketRateLimiter shared with other agent processes
+            emulator: An already initialized emulator to play on (e.g. one forked
+                from a ForkServer) instead of booting a new one; the agent stops it
         """
-        self.emulator = Emulator(rom_path, headless, sound)
-        self.emulator.initialize()  # Initialize the emulator
-        self.client = LLMClient()
+        if emulator is None:
+            if EMULATOR_SERVER:
+                emulator = RemoteEmulator(rom_path, headless, sound)
+            else:
+                emulator = Emulator(rom_path, headless, sound)
+            emulator.initialize()  # Initialize the emulator
+        self.emulator = emulator
+        self.client = LLMClient(rate_limiter)
+        # Summaries use their own client so background requests never share per-request state with play
+        self.summary_client = LLMClient(rate_limiter)
+        self.summarizer = IncrementalSummarizer(self.summary_client)
+        self.summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self.pending_summary = None
+        self.autopilot_stats = {"runs": 0, "presses": 0, "battle_actions": 0, "llm_calls_saved": 0}
+        self.battle_policy = BattlePolicy(BATTLE_AUTOPILOT_LOW_HP, BATTLE_AUTOPILOT_LEVEL_MARGIN, BATTLE_AUTOPILOT_MAX_TURNS)
         self.running = True
-        self.message_history = [{"role": "user", "content": "You may now begin playing."}]
+        self.steps_completed = 0
+        # Per-stage timing of agent steps; screenshots are encoded on the pipeline
+        # workers while the game state is decoded on the main thread
+        self.timer = StageTimer()
+        self.pipeline_executor = (
+            ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+            if PIPELINE_WORKERS else None
+        )
+        self.log_listener = start_background_logging() if BACKGROUND_LOGGING else None
+        self.allocation_tracer = AllocationTracer() if TRACE_ALLOCATIONS else None
+        self.blob_store = BlobStore(self.timer, ScreenshotEncoder(
+            SCREENSHOT_FORMAT, SCREENSHOT_QUALITY, SCREENSHOT_PNG_COMPRESS_LEVEL, SCREENSHOT_CACHE_SIZE
+        ))
+        self.message_history = MessageHistory(
+            self.blob_store,
+            MODEL_NAME,
+            [{"role": "user", "content": "You may now begin playing."}],
+        )
         self.max_history = max_history
+        self.context_policy = get_context_policy(context_policy)
+        # Worker processes are only started on the first lookahead search
+        self.lookahead = LookaheadSearch(rom_path, LOOKAHEAD_WORKERS, LOOKAHEAD_DEPTH, LOOKAHEAD_MAX_CANDIDATES)
+        self.savestate_ring = SavestateRing(
+            SAVESTATE_RING_SIZE, SAVESTATE_RING_INTERVAL, SAVESTATE_RING_COMPRESSION, SAVESTATE_RING_MAX_BYTES
+        )
         if load_state:
             logger.info(f"Loading saved state from {load_state}")
             self.emulator.load_state(load_state)
@@ -53,13 +139,7 @@ class SimpleAgent:
             tool_input = json.loads(tool_call.function.arguments)
         except json.JSONDecodeError as e:
             logger.error(f"JSON parse error in {tool_name} at pos {e.pos}: {e.msg}")
-            return {
-                "type": "tool_result",
-                "tool_use_id": tool_call.id,
-                "content": [
-                    {"type": "text", "text": f"Error parsing arguments: {e.msg}. Please fix your JSON formatting."}
-                ],
-            }
+            return self.error_result(tool_call, f"Error parsing arguments: {e.msg}. Please fix your JSON formatting.")
 
         logger.info(f"Processing tool call: {tool_name}")
 
@@ -67,49 +147,12 @@ class SimpleAgent:
             buttons = tool_input.get("buttons", [])
             if not buttons:
                 logger.warning(f"[Buttons] Empty buttons argument received, skipping")
-                return {
-                    "type": "tool_result",
-                    "tool_use_id": tool_call.id,
-                    "content": [
-                        {"type": "text", "text": "Error: No buttons specified. Please provide a list of buttons to press."}
-                    ],
-                }
+                return self.error_result(tool_call, "Error: No buttons specified. Please provide a list of buttons to press.")
             wait = tool_input.get("wait", True)
             logger.info(f"[Buttons] Pressing: {buttons} (wait={wait})")
             
             result = self.emulator.press_buttons(buttons, wait)
-            
-            # Get a fresh screenshot after executing the buttons
-            screenshot = self.emulator.get_screenshot()
-            screenshot_b64 = get_screenshot_base64(screenshot, upscale=2)
-            
-            # Get game state from memory after the action
-            memory_info = self.emulator.get_state_from_memory()
-            
-            # Log the memory state after the tool call
-            logger.info(f"[Memory State after action]")
-            logger.info(memory_info)
-            
-            collision_map = self.emulator.get_collision_map()
-            if collision_map:
-                logger.info(f"[Collision Map after action]\n{collision_map}")
-            
-            # Return tool result as a dictionary (OpenAI image format)
-            return {
-                "type": "tool_result",
-                "tool_use_id": tool_call.id,
-                "content": [
-                    {"type": "text", "text": f"Pressed buttons: {', '.join(buttons)}"},
-                    {"type": "text", "text": "\nHere is a screenshot of the screen after your button presses:"},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{screenshot_b64}"
-                        },
-                    },
-                    {"type": "text", "text": f"\nGame state information from memory after your action:\n{memory_info}"},
-                ],
-            }
+            return self.action_result(tool_call, f"Pressed buttons: {', '.join(buttons)}", "after your button presses")
         elif tool_name == "navigate_to":
             row = tool_input["row"]
             col = tool_input["col"]
@@ -122,11 +165,118 @@ class SimpleAgent:
                 result = f"Navigation successful: followed path with {len(path)} steps"
             else:
                 result = f"Navigation failed: {status}"
-            
-            # Get a fresh screenshot after executing the navigation
-            screenshot = self.emulator.get_screenshot()
-            screenshot_b64 = get_screenshot_base64(screenshot, upscale=2)
-            
+            return self.action_result(tool_call, f"Navigation result: {result}", "after navigation")
+        elif tool_name == "input_sequence":
+            steps = tool_input.get("steps", [])
+            stop_on = tool_input.get("stop_on") or []
+            try:
+                if not isinstance(stop_on, list):
+                    raise ValueError(f"stop_on must be a list, got {stop_on!r}")
+                schedule = self.emulator.compile_schedule(steps)
+            except ValueError as e:
+                logger.warning(f"[Inputs] Invalid input sequence: {e}")
+                return self.error_result(tool_call, f"Error: {e}")
+            logger.info(f"[Inputs] Executing {len(steps)} steps (stop_on={stop_on})")
+
+            frames, stopped_by = self.emulator.execute_schedule(schedule, stop_on)
+            result = f"Executed input sequence over {frames} frames"
+            if stopped_by:
+                result += f" (stopped early: {stopped_by} started)"
+            return self.action_result(tool_call, result, "after the input sequence")
+        elif tool_name == "wait_until":
+            conditions = tool_input.get("conditions", [])
+            timeout_frames = tool_input.get("timeout_frames", 600)
+            logger.info(f"[Wait] Waiting until {conditions} (timeout {timeout_frames} frames)")
+            try:
+                frames, met = self.emulator.wait_until(conditions, timeout_frames)
+            except ValueError as e:
+                return self.error_result(tool_call, f"Error: {e}")
+            if met:
+                result = f"Condition '{met}' met after {frames} frames"
+            else:
+                result = f"Timed out after {frames} frames without any condition being met"
+            return self.action_result(tool_call, result, "after waiting")
+        elif tool_name == "rewind":
+            steps = tool_input.get("steps", 1)
+            try:
+                # The ring has already counted the current step
+                restored = self.rewind(self.savestate_ring.steps - 1 - parse_int(steps, "steps"))
+            except ValueError as e:
+                return self.error_result(tool_call, f"Error: {e}")
+            return self.action_result(tool_call, f"Rewound the game to the state before step {restored}", "after rewinding")
+        elif tool_name == "battle_lookahead":
+            try:
+                depth = max(1, min(parse_int(tool_input.get("turns", LOOKAHEAD_DEPTH), "turns"), 3))
+                logger.info(f"[Lookahead] Searching {depth} turns ahead")
+                outcomes = self.lookahead.search(self.emulator, depth)
+            except ValueError as e:
+                return self.error_result(tool_call, f"Error: {e}")
+            best = outcomes[0]
+            self.emulator.load_state_bytes(best.state)
+            battle_state = self.emulator.get_battle_state()
+            lines = [f"Simulated {len(outcomes)} move sequences and played the best one:"]
+            for outcome in outcomes[:5]:
+                lines.append(f"- slots {list(outcome.sequence)} (score {outcome.score:.2f}): {outcome.summary}")
+            lines.append(f"Battle text: {' '.join(best.transcript)}")
+            if battle_state is None:
+                lines.append("The battle has ended.")
+            return self.action_result(tool_call, "\n".join(lines), "after the chosen moves")
+        elif tool_name == "type_name":
+            text = tool_input.get("text", "")
+            logger.info(f"[Menu] Typing name: {text!r}")
+            try:
+                result = self.emulator.type_name(text, tool_input.get("finish", True))
+            except ValueError as e:
+                return self.error_result(tool_call, f"Error: {e}")
+            return self.action_result(tool_call, result, "after typing the name")
+        elif tool_name in ("use_item", "switch_pokemon", "use_move"):
+            logger.info(f"[Menu] {tool_name}: {tool_input}")
+            try:
+                if tool_name == "use_item":
+                    result = self.emulator.use_item(tool_input.get("item", ""), tool_input.get("slot"))
+                elif tool_name == "switch_pokemon":
+                    result = self.emulator.switch_pokemon(tool_input["slot"])
+                else:
+                    result = self.emulator.use_move(tool_input["slot"])
+            except (KeyError, ValueError) as e:
+                # Menus may already be open at this point, so still show the screen
+                logger.warning(f"[Menu] {tool_name} failed: {e}")
+                result = f"Error: {e}"
+            return self.action_result(tool_call, result, f"after {tool_name}")
+        else:
+            logger.error(f"Unknown tool called: {tool_name}")
+            return self.error_result(tool_call, f"Error: Unknown tool '{tool_name}'")
+
+    def error_result(self, tool_call, text):
+        """Build a text-only tool result."""
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_call.id,
+            "content": [
+                {"type": "text", "text": text}
+            ],
+        }
+
+    def action_result(self, tool_call, result_text, screenshot_caption):
+        """
+        Build the tool result after an action has run: advance any dialog it
+        opened, then report a fresh screenshot and the game state from memory.
+
+        Args:
+            tool_call: The tool call being answered
+            result_text: Description of what the action did
+            screenshot_caption: How the screenshot relates to the action, e.g. "after navigation"
+        """
+        with self.timer.stage("autopilot"):
+            autopilot_note = self.run_dialog_autopilot() + self.run_battle_autopilot()
+        
+        # Get a fresh screenshot after executing the action, straight from the
+        # screen buffer; it is encoded on a pipeline worker and only waited for
+        # when the next request is built
+        frame = self.emulator.get_frame()
+        screenshot_ref = self.blob_store.put_screenshot(frame, upscale=2, executor=self.pipeline_executor)
+        
+        with self.timer.stage("decode"):
             # Get game state from memory after the action
             memory_info = self.emulator.get_state_from_memory()
             
@@ -137,32 +287,113 @@ class SimpleAgent:
             collision_map = self.emulator.get_collision_map()
             if collision_map:
                 logger.info(f"[Collision Map after action]\n{collision_map}")
-            
-            # Return tool result as a dictionary (OpenAI image format)
-            return {
-                "type": "tool_result",
-                "tool_use_id": tool_call.id,
-                "content": [
-                    {"type": "text", "text": f"Navigation result: {result}"},
-                    {"type": "text", "text": "\nHere is a screenshot of the screen after navigation:"},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{screenshot_b64}"
-                        },
-                    },
-                    {"type": "text", "text": f"\nGame state information from memory after your action:\n{memory_info}"},
-                ],
-            }
-        else:
-            logger.error(f"Unknown tool called: {tool_name}")
-            return {
-                "type": "tool_result",
-                "tool_use_id": tool_call.id,
-                "content": [
-                    {"type": "text", "text": f"Error: Unknown tool '{tool_name}'"}
-                ],
-            }
+        
+        # Return tool result as a dictionary (OpenAI image format)
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_call.id,
+            "content": [
+                {"type": "text", "text": f"{result_text}{autopilot_note}"},
+                {"type": "text", "text": f"\nHere is a screenshot of the screen {screenshot_caption}:"},
+                screenshot_ref,
+                {"type": "text", "text": f"\nGame state information from memory after your action:\n{memory_info}"},
+            ],
+        }
+
+    def rewind(self, step):
+        """
+        Restore the game to the newest snapshot taken at or before an agent step.
+
+        Returns:
+            int: The step the restored snapshot was taken before
+
+        Raises:
+            ValueError: If no snapshot is that old
+        """
+        restored = self.savestate_ring.rewind_to_step(self.emulator, step)
+        logger.info(f"[Rewind] Restored the state from before step {restored}")
+        return restored
+
+    def run_dialog_autopilot(self):
+        """
+        Advance non-interactive dialog locally instead of spending LLM calls on pressing A.
+        Stops as soon as the text box closes or a decision (menu cursor, YES/NO) is needed.
+
+        Returns:
+            str: A note with the dialog transcript for the tool result, or "" if nothing was advanced
+        """
+        if not DIALOG_AUTOPILOT:
+            return ""
+        transcript, presses, pages = self.emulator.advance_dialog(DIALOG_AUTOPILOT_MAX_PRESSES)
+        if not presses:
+            return ""
+
+        self.autopilot_stats["runs"] += 1
+        self.autopilot_stats["presses"] += presses
+        # Each dialog page would otherwise have cost one model turn pressing A
+        self.autopilot_stats["llm_calls_saved"] += max(pages, 1)
+        logger.info(f"[Autopilot] Advanced dialog with {presses} A presses ({pages} pages)")
+
+        dialog_text = "\n".join(transcript)
+        return f"\n\nDialog was advanced automatically ({presses} A presses). Full dialog text:\n{dialog_text}"
+
+    def run_battle_autopilot(self):
+        """
+        Play trivial wild encounters locally with the battle policy: choose a move
+        or run, advance the battle text, and repeat until the battle ends or the
+        policy escalates to the model.
+
+        Returns:
+            str: A note with the actions taken for the tool result, or "" if none were
+        """
+        if not BATTLE_AUTOPILOT:
+            return ""
+        actions = []
+        escalation = None
+        for _ in range(BATTLE_AUTOPILOT_MAX_ACTIONS):
+            if not self.emulator.is_battle_menu_open():
+                break
+            state = self.emulator.get_battle_state()
+            if state is None:
+                break
+            decision = self.battle_policy.decide(state)
+            if decision.action == "escalate":
+                escalation = decision.reason
+                break
+            try:
+                if decision.action == "fight":
+                    result = self.emulator.use_move(decision.move_slot)
+                else:
+                    result = self.emulator.run_from_battle()
+            except ValueError as e:
+                escalation = str(e)
+                break
+            transcript, _, _ = self.emulator.advance_dialog(DIALOG_AUTOPILOT_MAX_PRESSES)
+            self.autopilot_stats["battle_actions"] += 1
+            self.autopilot_stats["llm_calls_saved"] += 1
+            logger.info(f"[Battle] {result} ({decision.reason})")
+            actions.append(f"- {result} ({decision.reason}): {' '.join(transcript)}")
+
+        if not actions:
+            return ""
+        note = "\n\nBattle actions taken automatically:\n" + "\n".join(actions)
+        if escalation:
+            note += f"\nHanding the battle back to you: {escalation}"
+        return note
+
+    def get_cache_state(self):
+        """
+        Return the response cache lookup state: the canonical game state and the
+        most recent RESPONSE_CACHE_ACTION_WINDOW actions as (tool name, arguments).
+        """
+        recent_actions = []
+        for msg in reversed(self.message_history):
+            if len(recent_actions) >= RESPONSE_CACHE_ACTION_WINDOW:
+                break
+            for tool_call in reversed(msg.get("tool_calls") or ()):
+                recent_actions.append((tool_call["function"]["name"], tool_call["function"]["arguments"]))
+        recent_actions = recent_actions[:RESPONSE_CACHE_ACTION_WINDOW][::-1]
+        return self.emulator.get_canonical_state(), recent_actions
 
     def run(self, num_steps=1):
         """Main agent loop.
@@ -174,20 +405,32 @@ class SimpleAgent:
 
         steps_completed = 0
         while self.running and steps_completed < num_steps:
+            step_start = time.perf_counter()
+            if self.allocation_tracer:
+                self.allocation_tracer.begin()
             try:
-                messages = copy.deepcopy(self.message_history)
+                with self.timer.stage("request_prep"):
+                    # Splice in a finished background summary before building the request
+                    if self.pending_summary:
+                        self.splice_summary()
 
-                # Prepend system message for OpenRouter
-                messages_with_system = [{"role": "system", "content": SYSTEM_PROMPT}] + messages
+                    # History records are immutable, so no copy is needed before the request.
+                    # Waits here for the latest screenshot if it is still being encoded.
+                    messages = self.message_history.request_messages()
+
+                    # Prepend system message for OpenRouter
+                    messages_with_system = [SYSTEM_MESSAGE] + messages
+                    phase = self.emulator.get_game_phase()
+                    cache_state = self.get_cache_state() if RESPONSE_CACHE_ENABLED else None
                 
                 # LLMClient handles caching
-                try:
+                with self.timer.stage("llm"):
                     response = self.client.create_completion(
                         messages=messages_with_system,
                         tools=AVAILABLE_TOOLS,
+                        phase=phase,
+                        cache_state=cache_state,
                     )
-                except Exception as e:
-                    raise
 
                 # Log usage with cache details
                 usage = response.usage
@@ -232,6 +475,9 @@ class SimpleAgent:
 
                 # Process tool calls
                 if tool_calls:
+                    # Snapshot the state before the actions run, for rewinding
+                    self.savestate_ring.step(self.emulator)
+
                     # Add assistant message to history (OpenRouter format)
                     self.message_history.append({
                         "role": "assistant",
@@ -241,22 +487,20 @@ class SimpleAgent:
                     
                     # Process tool calls and create tool results
                     tool_messages = []
-                    screenshot_b64 = None
-                    memory_info = None
+                    screenshot_ref = None
                     
                     for tool_call in tool_calls:
-                        tool_result = self.process_tool_call(tool_call)
+                        with self.timer.stage("action"):
+                            tool_result = self.process_tool_call(tool_call)
                         # Extract text and screenshot from tool result
                         content_parts = tool_result["content"]
                         text_parts = []
                         for part in content_parts:
                             if part.get("type") == "text":
                                 text_parts.append(part["text"])
-                            elif part.get("type") == "image_url":
-                                # Extract screenshot for later user message
-                                img_url = part.get("image_url", {}).get("url", "")
-                                if img_url.startswith("data:image/png;base64,"):
-                                    screenshot_b64 = img_url.replace("data:image/png;base64,", "")
+                            elif part.get("type") == "image_ref":
+                                # Keep the screenshot reference for the later user message
+                                screenshot_ref = part
                         
                         tool_messages.append({
                             "role": "tool",
@@ -269,21 +513,43 @@ class SimpleAgent:
                         self.message_history.append(tool_msg)
                     
                     # Send screenshot as user message so model can see it
-                    if screenshot_b64:
+                    if screenshot_ref:
                         self.message_history.append({
                             "role": "user",
                             "content": [
                                 {"type": "text", "text": "Here is the current game state:"},
-                                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot_b64}"}},
+                                screenshot_ref,
                             ]
                         })
 
-                    # Check if we need to summarize the history
-                    if len(self.message_history) >= self.max_history:
-                        self.summarize_history()
+                    # Check if we need to summarize the history or drop old screenshots
+                    history_start = time.perf_counter()
+                    history_model, history_tokens, token_budget = self.history_budget_usage()
+                    logger.info(
+                        f"[Agent] History: {len(self.message_history)} messages, ~{history_tokens} tokens "
+                        f"(budget {token_budget} for {history_model})"
+                    )
+                    if self.pending_summary is None and (
+                        len(self.message_history) >= self.max_history or history_tokens >= token_budget
+                    ):
+                        if BACKGROUND_SUMMARIZATION:
+                            self.start_summary()
+                        else:
+                            self.summarize_history()
+                    self.context_policy.apply(self.message_history, self.client.token_counter, self.blob_store)
+                    self.blob_store.retain(self.message_history)
+                    self.timer.record("history", time.perf_counter() - history_start)
 
                 steps_completed += 1
+                self.steps_completed += 1
+                self.timer.record("step", time.perf_counter() - step_start)
+                if self.allocation_tracer:
+                    self.allocation_tracer.end()
                 logger.info(f"Completed step {steps_completed}/{num_steps}")
+                if STAGE_TIMING_LOG_EVERY and self.steps_completed % STAGE_TIMING_LOG_EVERY == 0:
+                    logger.info(f"[Timing] {self.timer.format()}")
+                    if self.allocation_tracer:
+                        logger.info(f"[Allocations] {self.allocation_tracer.format()}")
 
             except KeyboardInterrupt:
                 logger.info("Received keyboard interrupt, stopping")
@@ -297,84 +563,143 @@ class SimpleAgent:
 
         return steps_completed
 
+    def history_budget_usage(self):
+        """
+        Estimate the history for every model requests may be routed to, each with
+        its own calibration and budget.
+
+        Returns:
+            tuple[str, int, int]: (model, tokens, budget) for the model whose budget is closest to full
+        """
+        usage = []
+        for model in self.client.models():
+            tokens = self.client.token_counter.calibrated(self.message_history.raw_tokens_for(model), model)
+            budget = get_history_token_budget(model)
+            usage.append((tokens / budget, model, tokens, budget))
+        _, model, tokens, budget = max(usage)
+        return model, tokens, budget
+
     def summarize_history(self):
         """Generate a summary of the conversation history and replace the history with just the summary."""
+        self.start_summary()
+        self.splice_summary(wait=True)
+
+    def start_summary(self):
+        """
+        Summarize a snapshot of the current history in the background.
+
+        Play continues on the live history; once the summary arrives, splice_summary
+        replaces the snapshotted prefix with it.
+        """
         logger.info(f"[Agent] Generating conversation summary...")
         
-        # Get a new screenshot for the summary
-        screenshot = self.emulator.get_screenshot()
-        screenshot_b64 = get_screenshot_base64(screenshot, upscale=2)
+        # Get a new screenshot for the summary, pinned until the summary is spliced in
+        frame = self.emulator.get_frame()
+        screenshot_ref = self.blob_store.put_screenshot(frame, upscale=2)
+        self.blob_store.pin(screenshot_ref["image_ref"]["key"])
         
-        # Create messages for the summarization request - pass the entire conversation history
-        messages = copy.deepcopy(self.message_history) 
+        # The records are immutable, so a shallow copy is a consistent snapshot.
+        # Only text is summarized, so the screenshots are never materialized.
+        messages = list(self.message_history)
+        future = self.summary_executor.submit(self.summarizer.fold, messages)
+        self.pending_summary = (len(messages), screenshot_ref, future)
 
-        messages.append({
-            "role": "user",
-            "content": SUMMARY_PROMPT,
-        })
-        
-        # Prepend system message for OpenRouter
-        messages_with_system = [{"role": "system", "content": SYSTEM_PROMPT}] + messages
-        
-        # Get summary from the model
-        response = self.client.create_completion(
-            messages=messages_with_system,
-            temperature=SUMMARY_TEMPERATURE,
-        )
-        
-        # Log usage with cache details
-        usage = response.usage
-        if usage:
-            log_msg = f"Summarization usage: prompt={usage.prompt_tokens}, completion={usage.completion_tokens}, total={usage.total_tokens}"
-            if hasattr(usage, 'prompt_tokens_details') and usage.prompt_tokens_details:
-                details = usage.prompt_tokens_details
-                if hasattr(details, 'cached_tokens') and details.cached_tokens:
-                    log_msg += f", cached={details.cached_tokens}"
-            if hasattr(usage, 'cache_write_tokens') and usage.cache_write_tokens:
-                log_msg += f", cache_write={usage.cache_write_tokens}"
-            logger.info(log_msg)
-        else:
-            logger.info("Summarization usage: None")
-        
-        # Extract the summary text
-        summary_text = response.choices[0].message.content
+    def splice_summary(self, wait=False):
+        """
+        Replace the summarized prefix of the history with the finished summary.
+
+        Args:
+            wait: Block until the summary is ready instead of returning if it is still running
+        """
+        summarized_count, screenshot_ref, future = self.pending_summary
+        if not wait and not future.done():
+            return
+        self.pending_summary = None
+        self.blob_store.unpin(screenshot_ref["image_ref"]["key"])
+
+        try:
+            summary_text = future.result()
+        except Exception as e:
+            logger.error(f"[Agent] Summarization failed, keeping full history: {e}")
+            return
         
         logger.info(f"[Agent] Game Progress Summary:")
         logger.info(f"{summary_text}")
         
-        # Replace message history with just the summary
-        self.message_history = [
+        # Replace the summarized messages with just the summary; newer messages are kept
+        self.message_history.splice(summarized_count, [
             {
                 "role": "user",
                 "content": [
                     {
                         "type": "text",
-                        "text": f"CONVERSATION HISTORY SUMMARY (representing {self.max_history} previous messages): {summary_text}"
+                        "text": f"CONVERSATION HISTORY SUMMARY (representing {self.summarizer.messages_summarized} previous messages): {summary_text}"
                     },
                     {
                         "type": "text",
-                        "text": "\n\nCurrent game screenshot for reference:"
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{screenshot_b64}"
-                        },
+                        "text": "\n\nGame screenshot at the time of the summary:"
                     },
+                    screenshot_ref,
                     {
                         "type": "text",
                         "text": "You were just asked to summarize your playthrough so far, which is the summary you see above. You may now continue playing by selecting your next action."
                     },
                 ]
             }
-        ]
+        ])
         
-        logger.info(f"[Agent] Message history condensed into summary.")
+        self.blob_store.retain(self.message_history)
+        logger.info(f"[Agent] Message history condensed into summary ({len(self.message_history)} messages now).")
         
+    def log_request_stats(self):
+        """Log the average request size and prompt tokens under the active context policy."""
+        stats = self.client.request_stats
+        if not stats:
+            return
+        avg_bytes = sum(s["request_bytes"] for s in stats) / len(stats)
+        avg_estimate = sum(s["estimated_tokens"] for s in stats) / len(stats)
+        reported = [s["prompt_tokens"] for s in stats if s["prompt_tokens"]]
+        avg_reported = sum(reported) / len(reported) if reported else None
+        logger.info(
+            f"[Context] policy={self.context_policy.name}, requests={len(stats)}, "
+            f"avg_request_bytes={avg_bytes:.0f}, avg_estimated_tokens={avg_estimate:.0f}, "
+            f"avg_prompt_tokens={f'{avg_reported:.0f}' if avg_reported else 'n/a'}, "
+            f"cache_hit_ratio={self.client.cache_hit_ratio():.0%}"
+        )
+
     def stop(self):
         """Stop the agent."""
+        self.log_request_stats()
+        self.client.log_tier_stats()
+        self.client.flush()
+        self.summary_client.flush()
+        if DIALOG_AUTOPILOT or BATTLE_AUTOPILOT:
+            stats = self.autopilot_stats
+            logger.info(
+                f"[Autopilot] runs={stats['runs']}, presses={stats['presses']}, "
+                f"battle_actions={stats['battle_actions']}, llm_calls_saved={stats['llm_calls_saved']}"
+            )
         self.running = False
+        self.summary_executor.shutdown(wait=False, cancel_futures=True)
+        if self.pipeline_executor is not None:
+            self.pipeline_executor.shutdown(wait=False, cancel_futures=True)
+        self.lookahead.close()
+        ring = self.savestate_ring.stats()
+        logger.info(
+            f"[Savestates] snapshots={ring['snapshots']}, bytes={ring['bytes']}, "
+            f"compression_ratio={ring['compression_ratio']:.1f}, captures={ring['captures']}, "
+            f"mean_capture_ms={ring['mean_capture_ms']:.2f}, max_capture_ms={ring['max_capture_ms']:.2f}"
+        )
+        encoder = self.blob_store.encoder
+        logger.info(f"[Screenshots] format={encoder.format}, encoded={encoder.misses}, reused={encoder.hits}")
+        logger.info(f"[Timing] {self.timer.format()}")
+        if self.allocation_tracer:
+            logger.info(f"[Allocations] {self.allocation_tracer.format()}")
+            self.allocation_tracer.stop()
+            self.allocation_tracer = None
         self.emulator.stop()
+        stop_background_logging(self.log_listener)
+        self.log_listener = None
 
 
 if __name__ == "__main__":
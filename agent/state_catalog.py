@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+
+from agent.memory_reader import PokemonRedReader
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    location TEXT NOT NULL COLLATE NOCASE,
+    map_id INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    badges INTEGER NOT NULL,
+    badge_names TEXT NOT NULL,
+    party_levels TEXT NOT NULL,
+    max_level INTEGER NOT NULL,
+    pokedex_caught INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS states_location_badges ON states (location, badges);
+CREATE INDEX IF NOT EXISTS states_badges_level ON states (badges, max_level);
+"""
+
+# Query fields accepted by StateCatalog.query and parse_query
+QUERY_FIELDS = {
+    "location": "location = ?",
+    "map_id": "map_id = ?",
+    "badges": "badges = ?",
+    "min_badges": "badges >= ?",
+    "min_level": "max_level >= ?",
+    "max_level": "max_level <= ?",
+    "min_pokedex": "pokedex_caught >= ?",
+}
+
+
+@dataclass
+class StateEntry:
+    """A savestate in the catalog with the progress decoded from it."""
+
+    id: int
+    path: str
+    location: str
+    map_id: int
+    x: int
+    y: int
+    badges: int
+    badge_names: list[str]
+    party_levels: list[int]
+    max_level: int
+    pokedex_caught: int
+    created: float
+
+
+def parse_query(text):
+    """
+    Parse a query such as "location=CERULEAN CITY,badges=2" into StateCatalog.query arguments.
+
+    Raises:
+        ValueError: For unknown fields or malformed terms
+    """
+    query = {}
+    for term in filter(None, (term.strip() for term in text.split(","))):
+        field, sep, value = term.partition("=")
+        field = field.strip()
+        if not sep or field not in QUERY_FIELDS:
+            raise ValueError(f"Invalid query term {term!r}. Fields: {', '.join(QUERY_FIELDS)}")
+        query[field] = value.strip() if field == "location" else int(value)
+    return query
+
+
+class StateCatalog:
+    """
+    An index of savestate files by game progress, stored in SQLite.
+
+    States are written to `states_dir` under the hash of their contents, and the
+    progress decoded from memory when they were taken (map, coordinates, badges,
+    party levels, pokédex count) is stored alongside, so sessions and benchmarks
+    can start from e.g. the first state in CERULEAN CITY with 2 badges.
+    """
+
+    def __init__(self, path="states/catalog.sqlite3", states_dir="states"):
+        self.path = path
+        self.states_dir = states_dir
+        os.makedirs(states_dir, exist_ok=True)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add(self, emulator, state=None):
+        """
+        Store the emulator's current state (or the given state bytes, which must
+        match the emulator's current memory) and index its progress.
+
+        Returns:
+            StateEntry: The catalog entry
+        """
+        if state is None:
+            state = emulator.save_state_bytes()
+        digest = hashlib.blake2b(state, digest_size=16).hexdigest()
+        path = os.path.join(self.states_dir, f"{digest}.state")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(state)
+        return self._index(emulator, path)
+
+    def add_file(self, emulator, path):
+        """
+        Index an existing state file by loading it into the emulator.
+
+        Returns:
+            StateEntry: The catalog entry
+        """
+        emulator.load_state(path)
+        return self._index(emulator, path)
+
+    def _index(self, emulator, path):
+        reader = PokemonRedReader(emulator.pyboy.memory)
+        x, y = reader.read_coordinates()
+        badge_names = reader.read_badges()
+        party_levels = [pokemon.level for pokemon in reader.read_party_pokemon()]
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO states (path, location, map_id, x, y, badges, badge_names, "
+                "party_levels, max_level, pokedex_caught, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path,
+                    reader.read_location(),
+                    reader.read_map_id(),
+                    x,
+                    y,
+                    len(badge_names),
+                    ",".join(badge_names),
+                    json.dumps(party_levels),
+                    max(party_levels, default=0),
+                    reader.read_pokedex_caught_count(),
+                    time.time(),
+                ),
+            )
+        return self.query(path=path)[0]
+
+    def query(self, limit=1, path=None, **filters):
+        """
+        Find states matching all given filters (see QUERY_FIELDS), oldest first.
+
+        Returns:
+            list[StateEntry]: At most `limit` entries
+        """
+        unknown = set(filters) - set(QUERY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown query fields {sorted(unknown)}. Fields: {', '.join(QUERY_FIELDS)}")
+        clauses = [QUERY_FIELDS[field] for field in filters]
+        params = list(filters.values())
+        if path is not None:
+            clauses.append("path = ?")
+            params.append(path)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.db.execute(f"SELECT * FROM states {where} ORDER BY id LIMIT ?", (*params, limit)).fetchall()
+        return [
+            StateEntry(*row[:7], row[7].split(",") if row[7] else [], json.loads(row[8]), *row[9:])
+            for row in rows
+        ]
+
+    def find(self, query):
+        """
+        Return the path of the first state matching a query string such as
+        "location=CERULEAN CITY,badges=2".
+
+        Raises:
+            ValueError: If the query is invalid or nothing matches
+        """
+        entries = self.query(**parse_query(query))
+        if not entries:
+            raise ValueError(f"No savestate matches {query!r}")
+        return entries[0].path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from agent.emulator import Emulator
+
+    parser = argparse.ArgumentParser(description="Index savestate files or query the savestate catalog")
+    parser.add_argument("--catalog", default="states/catalog.sqlite3", help="Path to the catalog database")
+    parser.add_argument("--states-dir", default="states", help="Directory for states stored by the catalog")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="Index existing state files")
+    add_parser.add_argument("rom", help="Path to the Pokemon ROM file")
+    add_parser.add_argument("states", nargs="+", help="State files to index")
+    query_parser = subparsers.add_parser("query", help="List states matching a query")
+    query_parser.add_argument("query", nargs="?", default="", help='e.g. "location=CERULEAN CITY,badges=2"')
+    query_parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = StateCatalog(args.catalog, args.states_dir)
+    if args.command == "add":
+        emulator = Emulator(args.rom, headless=True)
+        for state_path in args.states:
+            entry = catalog.add_file(emulator, state_path)
+            print(f"{entry.path}: {entry.location} {entry.x},{entry.y}, {entry.badges} badges, levels {entry.party_levels}")
+        emulator.stop()
+    else:
+        start = time.perf_counter()
+        entries = catalog.query(limit=args.limit, **parse_query(args.query))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for entry in entries:
+            print(
+                f"{entry.path}: {entry.location} {entry.x},{entry.y}, {entry.badges} badges, "
+                f"levels {entry.party_levels}, {entry.pokedex_caught} caught"
+            )
+        print(f"{len(entries)} states in {elapsed_ms:.2f} ms")
+    catalog.close()
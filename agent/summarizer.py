@@ -0,0 +1,155 @@
+import logging
+
+from config import SUMMARY_CHAPTER_FOLDS, SUMMARY_MAX_TRANSCRIPT_CHARS, SUMMARY_TEMPERATURE
+
+from agent.prompts import LONG_TERM_SUMMARY_PROMPT, SUMMARY_PROMPT, SYSTEM_PROMPT
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MARKER = "CONVERSATION HISTORY SUMMARY"
+STATE_MARKER = "Game state information from memory after your action:"
+
+
+def is_summary_message(message):
+    """Check if a history message is a spliced-in conversation summary."""
+    content = message.get("content")
+    if not isinstance(content, (list, tuple)):
+        return False
+    return any(
+        part.get("type") == "text" and (part.get("text") or "").startswith(SUMMARY_MARKER)
+        for part in content
+    )
+
+
+class IncrementalSummarizer:
+    """
+    Maintains a two-level running summary of the playthrough.
+
+    Each fold sends only the messages added since the previous fold, as a
+    text transcript (reasoning, actions and game state deltas, no images),
+    together with the current chapter summary. After `chapter_folds` folds
+    the chapter is merged into the long-term summary and a new chapter starts,
+    so every summarization call stays roughly the same size however long the
+    session runs.
+    """
+
+    def __init__(self, client, chapter_folds=SUMMARY_CHAPTER_FOLDS, max_transcript_chars=SUMMARY_MAX_TRANSCRIPT_CHARS):
+        self.client = client
+        self.chapter_folds = chapter_folds
+        self.max_transcript_chars = max_transcript_chars
+        self.long_term_summary = ""
+        self.chapter_summary = ""
+        self.folds_in_chapter = 0
+        self.messages_summarized = 0
+        # Memory state lines of the last tool result seen, to report deltas only
+        self.last_state = []
+
+    def summary_text(self):
+        """Return the combined summary to show the model."""
+        if not self.long_term_summary:
+            return self.chapter_summary
+        if not self.chapter_summary:
+            return self.long_term_summary
+        return f"Long-term summary:\n{self.long_term_summary}\n\nCurrent chapter:\n{self.chapter_summary}"
+
+    def fold(self, messages):
+        """
+        Fold new history messages into the running summary.
+
+        Args:
+            messages: History messages since the last fold (a previous summary message is skipped)
+
+        Returns:
+            str: The combined summary text
+        """
+        messages = [msg for msg in messages if not is_summary_message(msg)]
+        transcript = self.transcript(messages)
+        self.chapter_summary = self._complete(
+            f"{SUMMARY_PROMPT}\n\n"
+            f"LONG-TERM SUMMARY:\n{self.long_term_summary or '(none yet)'}\n\n"
+            f"CHAPTER SUMMARY:\n{self.chapter_summary or '(none yet)'}\n\n"
+            f"TRANSCRIPT OF NEW EVENTS:\n{transcript}"
+        )
+        self.messages_summarized += len(messages)
+        self.folds_in_chapter += 1
+
+        if self.folds_in_chapter >= self.chapter_folds:
+            logger.info("[Summarizer] Folding chapter into the long-term summary")
+            self.long_term_summary = self._complete(
+                f"{LONG_TERM_SUMMARY_PROMPT}\n\n"
+                f"LONG-TERM SUMMARY:\n{self.long_term_summary or '(none yet)'}\n\n"
+                f"CHAPTER SUMMARY:\n{self.chapter_summary}"
+            )
+            self.chapter_summary = ""
+            self.folds_in_chapter = 0
+
+        return self.summary_text()
+
+    def transcript(self, messages):
+        """Render history messages as a compact text transcript without images."""
+        lines = []
+        for msg in messages:
+            role = msg.get("role")
+            content = msg.get("content")
+            if role == "assistant":
+                if content:
+                    lines.append(f"Reasoning: {content}")
+                for tool_call in msg.get("tool_calls") or []:
+                    function = tool_call["function"]
+                    lines.append(f"Action: {function['name']}({function['arguments']})")
+            elif role == "tool":
+                lines.extend(self._tool_result_lines(content))
+            elif isinstance(content, str):
+                lines.append(f"User: {content}")
+            elif content:
+                text = " ".join(
+                    part["text"] for part in content
+                    if part.get("type") == "text" and part["text"] != "Here is the current game state:"
+                ).strip()
+                if text:
+                    lines.append(f"User: {text}")
+
+        transcript = "\n".join(lines)
+        if len(transcript) > self.max_transcript_chars:
+            transcript = "[... earlier events truncated ...]\n" + transcript[-self.max_transcript_chars:]
+        return transcript
+
+    def _tool_result_lines(self, content):
+        """Return the result of a tool call and the game state lines that changed since the last one."""
+        result, _, state = content.partition(STATE_MARKER)
+        lines = [
+            f"Result: {line.strip()}" for line in result.splitlines()
+            if line.strip() and "screenshot" not in line
+        ]
+        state_lines = [line for line in state.splitlines() if line.strip()]
+        if state_lines:
+            previous = set(self.last_state)
+            changed = [line for line in state_lines if line not in previous]
+            if changed:
+                lines.append("State changes:\n" + "\n".join(changed))
+            self.last_state = state_lines
+        return lines
+
+    def _complete(self, prompt):
+        """Send a text-only summarization request and return the reply."""
+        response = self.client.create_completion(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=SUMMARY_TEMPERATURE,
+        )
+
+        # Log usage with cache details
+        usage = response.usage
+        if usage:
+            log_msg = f"Summarization usage: prompt={usage.prompt_tokens}, completion={usage.completion_tokens}, total={usage.total_tokens}"
+            if hasattr(usage, 'prompt_tokens_details') and usage.prompt_tokens_details:
+                details = usage.prompt_tokens_details
+                if hasattr(details, 'cached_tokens') and details.cached_tokens:
+                    log_msg += f", cached={details.cached_tokens}"
+            logger.info(log_msg)
+        else:
+            logger.info("Summarization usage: None")
+
+        return response.choices[0].message.content
@@ -0,0 +1,168 @@
+import base64
+import json
+import logging
+import math
+import struct
+
+from config import HISTORY_TOKEN_BUDGETS
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text and JSON tool arguments
+CHARS_PER_TOKEN = 4
+# Per-message framing (role markers, separators) added by chat templates
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def get_history_token_budget(model):
+    """Return the history token budget configured for a model."""
+    return HISTORY_TOKEN_BUDGETS.get(model, HISTORY_TOKEN_BUDGETS["default"])
+
+
+def estimate_text_tokens(text):
+    """Estimate the number of tokens in a piece of text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def get_image_size(url):
+    """
+    Read the (width, height) of a base64 PNG data URL from its IHDR chunk.
+
+    Returns:
+        tuple[int, int] | None: Image size, or None if the URL is not a PNG data URL
+    """
+    if not url.startswith("data:image/png;base64,"):
+        return None
+    # 8 byte signature + 4 byte length + "IHDR" + width + height = 24 bytes = 32 base64 chars
+    header = base64.b64decode(url[len("data:image/png;base64,"):][:32])
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def estimate_image_tokens(width, height, model=""):
+    """
+    Estimate the prompt tokens an image costs for the given model.
+
+    Providers bill images differently: Gemini charges a flat rate per image,
+    OpenAI charges per 512px tile and Anthropic charges per pixel area.
+    """
+    if model.startswith("google/"):
+        return 258
+    if model.startswith("openai/"):
+        tiles = math.ceil(width / 512) * math.ceil(height / 512)
+        return 85 + 170 * tiles
+    return math.ceil(width * height / 750)
+
+
+def estimate_part_tokens(part, model=""):
+    """Estimate the tokens of a single multipart content part."""
+    if part.get("type") == "text":
+        return estimate_text_tokens(part.get("text"))
+    if part.get("type") == "image_url":
+        size = get_image_size(part.get("image_url", {}).get("url", ""))
+        if size is None:
+            # Unknown encoding, assume a 2x upscaled Game Boy frame
+            size = (320, 288)
+        return estimate_image_tokens(size[0], size[1], model)
+    if part.get("type") == "image_ref":
+        ref = part["image_ref"]
+        return estimate_image_tokens(ref["width"], ref["height"], model)
+    return 0
+
+
+def estimate_message_tokens(message, model=""):
+    """Estimate the tokens of a single chat message."""
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimate_text_tokens(content)
+    elif isinstance(content, (list, tuple)):
+        for part in content:
+            tokens += estimate_part_tokens(part, model)
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_text_tokens(function.get("name"))
+        tokens += estimate_text_tokens(function.get("arguments"))
+    return tokens
+
+
+def estimate_image_tokens_in_message(message, model=""):
+    """Estimate the tokens used by the images in a single chat message."""
+    content = message.get("content")
+    if not isinstance(content, (list, tuple)):
+        return 0
+    return sum(
+        estimate_part_tokens(part, model)
+        for part in content
+        if part.get("type") in ("image_url", "image_ref")
+    )
+
+
+class TokenCounter:
+    """
+    Estimates prompt tokens locally and calibrates the estimate against the
+    prompt_tokens the provider reports in response.usage.
+    """
+
+    def __init__(self, model):
+        # Model used when a call does not name one; requests routed to other
+        # models are estimated and calibrated for that model
+        self.model = model
+        # Ratio of reported to estimated tokens per model, smoothed over requests
+        self.calibrations = {}
+        self.last_estimate = None
+        self.last_actual = None
+
+    @property
+    def calibration(self):
+        """Calibration ratio of the default model."""
+        return self.calibration_for(self.model)
+
+    def calibration_for(self, model=None):
+        return self.calibrations.get(model or self.model, 1.0)
+
+    def calibrated(self, raw_tokens, model=None):
+        """Apply a model's calibration ratio to a raw token estimate."""
+        return math.ceil(raw_tokens * self.calibration_for(model))
+
+    def estimate_messages(self, messages, tools=None, model=None):
+        """Estimate the calibrated prompt tokens of a list of messages (and tool definitions) for a model."""
+        model = model or self.model
+        tokens = sum(estimate_message_tokens(m, model) for m in messages)
+        if tools:
+            tokens += estimate_text_tokens(json.dumps(tools))
+        return math.ceil(tokens * self.calibration_for(model))
+
+    def estimate_images(self, messages, model=None):
+        """Estimate the calibrated prompt tokens used by images in a list of messages."""
+        model = model or self.model
+        tokens = sum(estimate_image_tokens_in_message(m, model) for m in messages)
+        return math.ceil(tokens * self.calibration_for(model))
+
+    def observe(self, estimate, usage, model=None):
+        """
+        Record the provider-reported prompt tokens for a request with the given estimate.
+
+        Args:
+            estimate: The calibrated estimate made before sending the request
+            usage: The response.usage object (may be None)
+            model: The model the request was sent to
+        """
+        model = model or self.model
+        self.last_estimate = estimate
+        self.last_actual = getattr(usage, "prompt_tokens", None) if usage else None
+        if not self.last_actual or not estimate:
+            return
+        calibration = self.calibration_for(model)
+        raw_estimate = estimate / calibration
+        ratio = self.last_actual / raw_estimate
+        # Exponential moving average so a single odd response does not skew the budget
+        self.calibrations[model] = 0.8 * calibration + 0.2 * ratio
+        logger.info(
+            f"[Tokens] model={model}, estimated={estimate}, actual={self.last_actual}, "
+            f"error={(estimate - self.last_actual) / self.last_actual:+.1%}, "
+            f"calibration={self.calibrations[model]:.2f}"
+        )
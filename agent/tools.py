@@ -1,4 +1,4 @@
-from config import USE_NAVIGATOR
+from config import REWIND_TOOL, USE_NAVIGATOR
 
 AVAILABLE_TOOLS = [
     {
@@ -25,6 +25,171 @@ AVAILABLE_TOOLS = [
                 "required": ["buttons"],
             },
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "input_sequence",
+            "description": "Execute a timed sequence of inputs in one go. The Game Boy runs at 60 frames per second. Each step presses a button (held for hold_frames, repeated repeat times, each press followed by wait_frames), or just waits for wait_frames when no button is given. Use this to express multi-step intentions (e.g. walk 5 tiles up, then talk) in a single action.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "button": {
+                                    "type": "string",
+                                    "enum": ["a", "b", "start", "select", "up", "down", "left", "right"],
+                                    "description": "Button to press. Omit to only wait."
+                                },
+                                "hold_frames": {
+                                    "type": "integer",
+                                    "description": "Frames to hold the button down. Defaults to 10."
+                                },
+                                "repeat": {
+                                    "type": "integer",
+                                    "description": "How many times to press the button. Defaults to 1."
+                                },
+                                "wait_frames": {
+                                    "type": "integer",
+                                    "description": "Frames to wait after each press (or on their own without a button). Defaults to 120 after a button press, 0 otherwise."
+                                }
+                            }
+                        },
+                        "description": "Steps to execute in order. The whole sequence may last at most 3600 frames."
+                    },
+                    "stop_on": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "enum": ["dialog", "battle"]
+                        },
+                        "description": "Stop the sequence early if a dialog box opens or a battle starts."
+                    }
+                },
+                "required": ["steps"],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "wait_until",
+            "description": "Let the game run without pressing anything until a condition holds, e.g. while an animation, a battle message or a scripted event plays out. Returns as soon as any of the conditions is met or the timeout passes. Prefer this over pressing buttons just to pass time.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "conditions": {
+                        "type": "array",
+                        "items": {
+                            "type": "string",
+                            "enum": ["dialog_closed", "dialog_opened", "battle_ended", "map_changed"]
+                        },
+                        "description": "Stop waiting when any of these holds: the text box is closed, a text box is open, no battle is running, or the map differs from the one at the start of the wait."
+                    },
+                    "timeout_frames": {
+                        "type": "integer",
+                        "description": "Maximum frames to wait (60 frames = 1 second, at most 3600). Defaults to 600."
+                    }
+                },
+                "required": ["conditions"],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "battle_lookahead",
+            "description": "For important battles: simulate every combination of the active Pokemon's moves for the next turns from the current state, score the outcomes by HP dealt and lost and by fainting, and play the best sequence. Only works while the battle menu (FIGHT/PKMN/ITEM/RUN) is open.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "turns": {
+                        "type": "integer",
+                        "description": "How many turns to look ahead (1-3). Defaults to 2."
+                    }
+                },
+                "required": [],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "type_name",
+            "description": "On the name-entry screen (the keyboard with \"lower case\"/\"UPPER CASE\" at the bottom), type a whole name at once. Moves the cursor along the shortest path for every character, switching case as needed, and by default confirms the name.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "text": {
+                        "type": "string",
+                        "description": "The name to type: letters, spaces and the symbols on the keyboard. At most 7 characters for the player and rival, 10 for Pokemon."
+                    },
+                    "finish": {
+                        "type": "boolean",
+                        "description": "Whether to confirm the name with START after typing it. Defaults to true."
+                    }
+                },
+                "required": ["text"],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "use_item",
+            "description": "Use an item from the bag in one step, in battle (from the battle menu) or in the overworld (opens the start menu). Navigates the menus, selects the item and, if given, the target Pokemon, and reports whether the item was consumed.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "item": {
+                        "type": "string",
+                        "description": "Item name as listed in the inventory, e.g. POTION."
+                    },
+                    "slot": {
+                        "type": "integer",
+                        "description": "Party slot (1-6) of the Pokemon to use the item on, for items such as potions."
+                    }
+                },
+                "required": ["item"],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "switch_pokemon",
+            "description": "In battle, switch to the Pokemon in the given party slot. Only works while the battle menu (FIGHT/PKMN/ITEM/RUN) is open.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "slot": {
+                        "type": "integer",
+                        "description": "Party slot (1-6) of the Pokemon to send out."
+                    }
+                },
+                "required": ["slot"],
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "use_move",
+            "description": "In battle, use the move in the given slot of the active Pokemon. Only works while the battle menu (FIGHT/PKMN/ITEM/RUN) is open.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "slot": {
+                        "type": "integer",
+                        "description": "Move slot (1-4), in the order the moves are listed for the Pokemon."
+                    }
+                },
+                "required": ["slot"],
+            },
+        }
     }
 ]
 
@@ -50,3 +215,22 @@ if USE_NAVIGATOR:
             },
         }
     })
+
+if REWIND_TOOL:
+    AVAILABLE_TOOLS.append({
+        "type": "function",
+        "function": {
+            "name": "rewind",
+            "description": "Undo your recent actions by restoring the game to how it was a number of steps ago. Use this after a clear mistake, e.g. a wrong menu choice or a lost battle.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "steps": {
+                        "type": "integer",
+                        "description": "How many of your previous steps to undo (1 = the state before your last step)."
+                    }
+                },
+                "required": ["steps"],
+            },
+        }
+    })
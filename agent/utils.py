@@ -1,14 +1,30 @@
 import base64
 import io
 
-def get_screenshot_base64(screenshot, upscale=1):
-    """Convert PIL image to base64 string."""
-    # Resize if needed
-    if upscale > 1:
-        new_size = (screenshot.width * upscale, screenshot.height * upscale)
-        screenshot = screenshot.resize(new_size)
-
-    # Convert to base64
+from PIL import Image
+
+
+def reduce_screenshot_base64(screenshot_b64, size=(160, 144)):
+    """Downscale a base64 PNG screenshot to native resolution, 2-bit grayscale."""
+    screenshot = Image.open(io.BytesIO(base64.b64decode(screenshot_b64)))
+    screenshot = screenshot.convert("L").resize(size, Image.NEAREST)
+    # The Game Boy only has four shades, so four gray levels lose almost nothing
+    screenshot = screenshot.quantize(colors=4)
+
     buffered = io.BytesIO()
-    screenshot.save(buffered, format="PNG")
+    screenshot.save(buffered, format="PNG", bits=2, optimize=True)
     return base64.standard_b64encode(buffered.getvalue()).decode()
+
+
+def parse_int(value, name):
+    """
+    Read an integer tool argument. Models sometimes send numbers as strings or
+    null, so anything that is not a whole number raises ValueError instead of
+    the TypeError int() would raise.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}") from None
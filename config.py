@@ -6,7 +6,127 @@ MAX_TOKENS = 10000
 
 USE_NAVIGATOR = False
 
+# Route each request to a model tier based on the game phase decoded from memory
+# ("dialog", "menu", "battle", "overworld"). Requests without a phase (summaries)
+# use MODEL_NAME. Prompt caches are per model, so switching tiers often costs cache hits.
+MODEL_ROUTING_ENABLED = True
+MODEL_TIERS = {
+    "cheap": MODEL_NAME,   # e.g. a small fast model for routine menus and dialog
+    "strong": MODEL_NAME,
+}
+PHASE_MODEL_TIERS = {
+    "dialog": "cheap",
+    "menu": "cheap",
+    "battle": "strong",
+    "overworld": "strong",
+}
+
+# Advance non-interactive dialog locally (pressing A) after each action and only
+# hand control back to the model once the text box closes or needs a decision.
+DIALOG_AUTOPILOT = True
+DIALOG_AUTOPILOT_MAX_PRESSES = 40
+
+# Fight or run from trivial wild encounters locally, using the battle state decoded
+# from memory and the type chart. Trainer battles, low HP and stronger enemies are
+# left to the model.
+BATTLE_AUTOPILOT = True
+BATTLE_AUTOPILOT_LOW_HP = 0.35  # fraction of max HP below which the model decides
+BATTLE_AUTOPILOT_LEVEL_MARGIN = 0  # levels the enemy may be above the player's Pokemon
+BATTLE_AUTOPILOT_MAX_TURNS = 3  # run if the enemy would take longer to defeat
+BATTLE_AUTOPILOT_MAX_ACTIONS = 10  # battle actions per tool call
+
+# Battle lookahead tool: simulate candidate move sequences from an in-memory savestate
+# on a pool of headless emulator processes and commit the best one.
+LOOKAHEAD_WORKERS = None  # processes; None uses one per CPU core
+LOOKAHEAD_DEPTH = 2  # turns per candidate sequence
+LOOKAHEAD_MAX_CANDIDATES = 16
+
+# In-memory ring of recent savestates for rewinding bad actions
+SAVESTATE_RING_SIZE = 32  # snapshots kept
+SAVESTATE_RING_INTERVAL = 1  # take a snapshot before every Nth agent step
+SAVESTATE_RING_COMPRESSION = "delta"  # "none", "zlib" or "delta" (XOR against the previous snapshot)
+SAVESTATE_RING_MAX_BYTES = 64 * 1024 * 1024
+# Savestate catalog indexed by game progress (see agent/state_catalog.py and --state-query)
+STATE_CATALOG_PATH = "states/catalog.sqlite3"
+STATE_CATALOG_DIR = "states"
+
+# Run the emulator in its own process behind a command queue; screen frames and WRAM
+# are shared with the agent process through shared memory (see agent/emulator_server.py)
+EMULATOR_SERVER = False
+
+# Shared OpenRouter rate limits for parallel sessions (python -m agent.session_runner)
+RATE_LIMIT_REQUESTS_PER_MINUTE = 60
+RATE_LIMIT_TOKENS_PER_MINUTE = 1_000_000
+
+# Screenshot encoding: "png" (palette mode), "webp" or "jpeg"; quality is used by
+# WebP/JPEG (None makes WebP lossless). Recent encodings are reused by frame hash.
+SCREENSHOT_FORMAT = "png"
+SCREENSHOT_QUALITY = 90
+SCREENSHOT_PNG_COMPRESS_LEVEL = 1  # smallest and fastest on Game Boy frames (python -m agent.screenshot_encoder)
+SCREENSHOT_CACHE_SIZE = 64
+
+# Pipelined agent step: screenshots are encoded on this many worker threads while the
+# game state is decoded (0 encodes inline), and log output is written by a listener thread
+PIPELINE_WORKERS = 2
+BACKGROUND_LOGGING = True
+# Log the per-stage timing breakdown every N steps (0 only logs it on stop)
+STAGE_TIMING_LOG_EVERY = 10
+# Measure peak Python allocations per step with tracemalloc (slow; for profiling only)
+TRACE_ALLOCATIONS = False
+
+# Offer the model a rewind tool that restores the state from a few steps ago
+REWIND_TOOL = False
+
+# Summarize the history in a background thread while play continues, then splice
+# the summary in place of the summarized messages.
+BACKGROUND_SUMMARIZATION = True
+# Summaries are folded incrementally from a text transcript of the new messages.
+# After this many folds the chapter summary is merged into the long-term summary.
+SUMMARY_CHAPTER_FOLDS = 5
+# Upper bound on the transcript sent per fold (the oldest part is truncated)
+SUMMARY_MAX_TRANSCRIPT_CHARS = 40000
+
 # Prompt caching configuration (OpenRouter)
 # Default disabled to keep behaviour unchanged unless explicitly enabled.
 PROMPT_CACHING_ENABLED = True
-PROMPT_CACHE_TTL = "5m"  # Can be "5m" or "1h"
\ No newline at end of file
+PROMPT_CACHE_TTL = "5m"  # Can be "5m" or "1h"
+# Advance a cache breakpoint along the history each step, so the growing
+# tool/screenshot history is read from the cache instead of re-billed in full.
+PROMPT_CACHE_ROLLING = True
+# Maximum cache breakpoints per request (Anthropic allows 4), including the
+# system prompt and summary breakpoints.
+PROMPT_CACHE_MAX_BREAKPOINTS = 4
+
+# Optional cache of model responses keyed by the canonical game state, the recent
+# actions and the model. An exact hit replays the cached tool calls without a request.
+# Meant for deterministic benchmark/regression runs from savestates.
+RESPONSE_CACHE_ENABLED = False
+RESPONSE_CACHE_PATH = "response_cache.json"
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # seconds
+RESPONSE_CACHE_ACTION_WINDOW = 4
+RESPONSE_CACHE_FLUSH_EVERY = 20  # new entries between writes of the cache file (also written on stop)
+
+# Build request bodies from cached JSON fragments of unchanged messages instead of
+# re-serializing the whole history on every request.
+CACHED_REQUEST_SERIALIZATION = True
+
+# Token budgets for the message history, keyed by model name ("default" is the fallback).
+# The history is summarized once its estimated prompt size reaches the budget.
+HISTORY_TOKEN_BUDGETS = {
+    "default": 50000,
+    "google/gemini-2.0-flash-exp:free": 100000,
+}
+# Older screenshots are evicted from the history once they cost more than this many tokens
+# (used by the "token_budget" context policy).
+IMAGE_TOKEN_BUDGET = 10000
+
+# How older screenshots in the history are handled: "keep_all", "token_budget" or "recent_screenshots".
+CONTEXT_POLICY = "recent_screenshots"
+# recent_screenshots: the last N screenshots stay at full resolution, the M before them are
+# reduced to 1x 2-bit grayscale, and anything older is replaced with a text stub.
+KEEP_FULL_SCREENSHOTS = 3
+KEEP_REDUCED_SCREENSHOTS = 6
+# Old screenshots are rewritten (reduced/stubbed/evicted) in batches of this many, so
+# the prompt prefix and its cache only change every few steps instead of on every step
+CONTEXT_POLICY_BATCH = 4
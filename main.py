@@ -4,6 +4,8 @@ import os
 from dotenv import load_dotenv
 
 from agent.simple_agent import SimpleAgent
+from agent.state_catalog import StateCatalog
+from config import CONTEXT_POLICY, STATE_CATALOG_DIR, STATE_CATALOG_PATH
 
 # Load environment variables from .env file
 load_dotenv()
@@ -54,6 +56,20 @@ def main():
         help="Path to a saved state to load"
     )
     
+    parser.add_argument(
+        "--state-query",
+        type=str,
+        default=None,
+        help='Start from the first cataloged savestate matching a query, e.g. "location=CERULEAN CITY,badges=2"'
+    )
+    
+    parser.add_argument(
+        "--context-policy",
+        type=str,
+        default=None,
+        help="How older screenshots are kept in history: keep_all, token_budget or recent_screenshots"
+    )
+    
     args = parser.parse_args()
     
     # Get absolute path to ROM
@@ -69,13 +85,26 @@ def main():
         print("Place the ROM in the root directory or specify its path with --rom.")
         return
     
+    load_state = args.load_state
+    if args.state_query:
+        catalog = StateCatalog(STATE_CATALOG_PATH, STATE_CATALOG_DIR)
+        try:
+            load_state = catalog.find(args.state_query)
+        except ValueError as e:
+            logger.error(f"Invalid --state-query: {e}")
+            return
+        finally:
+            catalog.close()
+        logger.info(f"Savestate matching {args.state_query!r}: {load_state}")
+    
     # Create and run agent
     agent = SimpleAgent(
         rom_path=rom_path,
         headless=not args.display,
         sound=args.sound if args.display else False,
         max_history=args.max_history,
-        load_state=args.load_state,
+        load_state=load_state,
+        context_policy=args.context_policy or CONTEXT_POLICY,
     )
     
     try:
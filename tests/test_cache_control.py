@@ -0,0 +1,100 @@
+import copy
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from config import PROMPT_CACHE_MAX_BREAKPOINTS, PROMPT_CACHE_ROLLING  # noqa: E402
+
+from agent.history import freeze  # noqa: E402
+from agent.llm_client import LLMClient  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    return LLMClient()
+
+
+def breakpoints(messages):
+    """Indices of the messages that carry a cache_control breakpoint."""
+    return [
+        i for i, message in enumerate(messages)
+        if isinstance(message["content"], (list, tuple))
+        and any("cache_control" in part for part in message["content"])
+    ]
+
+
+def step(i):
+    """The assistant tool call and the tool result of one agent step."""
+    return [
+        {"role": "assistant", "content": None, "tool_calls": [{"id": f"call_{i}"}]},
+        {"role": "tool", "tool_call_id": f"call_{i}", "content": [{"type": "text", "text": f"result {i}"}]},
+    ]
+
+
+def conversation(steps):
+    messages = [
+        {"role": "system", "content": "You are playing Pokemon Red."},
+        {"role": "user", "content": "You may now begin playing."},
+    ]
+    for i in range(steps):
+        messages += step(i)
+    return [freeze(message) for message in messages]
+
+
+def test_disabled_returns_the_messages_unchanged(client):
+    messages = conversation(2)
+    assert client.apply_cache_control(messages, enabled=False) is messages
+
+
+def test_system_prompt_breakpoint(client):
+    messages = conversation(0)
+    original = copy.deepcopy(messages)
+    annotated = client.apply_cache_control(messages, ttl="1h")
+
+    assert messages == original
+    system = annotated[0]["content"]
+    assert system[0] == {"type": "text", "text": "You are playing Pokemon Red."}
+    assert system[-1]["cache_control"] == {"type": "ephemeral", "ttl": "1h"}
+    # Unknown TTLs fall back to 5 minutes
+    annotated = client.apply_cache_control(messages, ttl="2h")
+    assert annotated[0]["content"][-1]["cache_control"]["ttl"] == "5m"
+
+
+def test_summary_breakpoint_follows_the_summary(client):
+    messages = conversation(0)
+    messages[1] = freeze({"role": "user", "content": [
+        {"type": "text", "text": "CONVERSATION HISTORY SUMMARY: ..."},
+        {"type": "text", "text": "Continue playing."},
+    ]})
+    summary = client.apply_cache_control(messages)[1]["content"]
+    assert "cache_control" not in summary[0]
+    assert summary[1]["cache_control"]["type"] == "ephemeral"
+
+
+@pytest.mark.skipif(not PROMPT_CACHE_ROLLING, reason="rolling breakpoints are disabled")
+def test_rolling_breakpoints_advance_along_the_history(client):
+    messages = conversation(1)
+    assert breakpoints(client.apply_cache_control(messages)) == [0, 3]
+
+    previous_tail = 3
+    for steps in range(2, 8):
+        messages = messages + [freeze(message) for message in step(steps - 1)]
+        marked = breakpoints(client.apply_cache_control(messages))
+        tail = len(messages) - 1
+        # The newest message gets a breakpoint and the previous one keeps its own
+        assert tail in marked and previous_tail in marked
+        assert marked[0] == 0
+        assert len(marked) <= PROMPT_CACHE_MAX_BREAKPOINTS
+        previous_tail = tail
+
+
+def test_annotated_copies_are_reused(client):
+    messages = conversation(2)
+    first = client.apply_cache_control(messages)
+    second = client.apply_cache_control(messages)
+    assert first[0] is second[0]
+    # Messages without a breakpoint are passed through
+    assert second[2] is messages[2]
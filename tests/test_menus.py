@@ -0,0 +1,56 @@
+import pytest
+
+from agent.menus import (
+    MAX_NAME_LENGTH,
+    NAME_KEYBOARD_CASE_ROW,
+    NAME_KEYBOARD_ROWS,
+    NAME_KEYBOARD_SYMBOLS,
+    _keyboard_moves,
+    plan_name_entry,
+)
+
+
+def type_on_keyboard(buttons, start):
+    """Replay buttons on the name-entry keyboard and return the typed text and the final cursor state."""
+    text = ""
+    state = start
+    for button in buttons:
+        if button == "a":
+            case, row, col = state
+            assert row != NAME_KEYBOARD_CASE_ROW
+            letters = NAME_KEYBOARD_ROWS[case] + NAME_KEYBOARD_SYMBOLS
+            text += letters[row][col]
+        else:
+            state = dict(_keyboard_moves(state))[button]
+    return text, state
+
+
+@pytest.mark.parametrize("text", ["ASH", "Red", "gary", "MR. X", "Zz!?", "A-Z/a.z,"])
+def test_plan_types_the_text(text):
+    start = ("upper", 0, 0)
+    buttons, final = plan_name_entry(text, start)
+    assert type_on_keyboard(buttons, start) == (text, final)
+    assert buttons.count("a") == len(text)
+
+
+def test_plan_takes_the_shortest_path():
+    start = ("upper", 0, 0)
+    assert plan_name_entry("A", start)[0] == ["a"]
+    assert plan_name_entry("B", start)[0] == ["right", "a"]
+    # Wrapping around the row is shorter than walking across it
+    assert plan_name_entry("I", start)[0] == ["left", "a"]
+    assert plan_name_entry("a", start)[0] == ["select", "a"]
+    # The space exists in both cases, so no case switch is needed
+    assert plan_name_entry(" ", ("lower", 2, 8))[0] == ["a"]
+
+
+def test_plan_starts_from_the_cursor():
+    buttons, final = plan_name_entry("S", ("upper", NAME_KEYBOARD_CASE_ROW, 0))
+    assert buttons == ["up", "up", "up", "a"]
+    assert final == ("upper", 2, 0)
+
+
+@pytest.mark.parametrize("text", ["", "A" * (MAX_NAME_LENGTH + 1), "ASH1", "é"])
+def test_plan_rejects_invalid_names(text):
+    with pytest.raises(ValueError):
+        plan_name_entry(text, ("upper", 0, 0))
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from agent.savestates import COMPRESSION_MODES, SavestateRing
+
+STATE_SIZE = 4096
+
+
+class FakeEmulator:
+    """Stands in for Emulator: the savestate is a bytearray that each step partly rewrites."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.state = bytearray(self.rng.randbytes(STATE_SIZE))
+
+    def advance(self):
+        for _ in range(32):
+            self.state[self.rng.randrange(STATE_SIZE)] = self.rng.randrange(256)
+
+    def save_state_bytes(self):
+        return bytes(self.state)
+
+    def load_state_bytes(self, state):
+        self.state = bytearray(state)
+
+
+def play(ring, emulator, steps):
+    """Run agent steps and return the state at the start of each one."""
+    states = []
+    for _ in range(steps):
+        states.append(emulator.save_state_bytes())
+        ring.step(emulator)
+        emulator.advance()
+    return states
+
+
+@pytest.mark.parametrize("compression", COMPRESSION_MODES)
+def test_rewind_restores_every_snapshot(compression):
+    for step in range(12):
+        emulator = FakeEmulator()
+        ring = SavestateRing(capacity=32, compression=compression, keyframe_interval=4)
+        states = play(ring, emulator, 12)
+
+        assert ring.rewind(emulator, 12 - step) == step
+        assert emulator.save_state_bytes() == states[step]
+        # Rewinding drops the snapshots after the restored one, but keeps the restored one
+        assert len(ring) == step + 1
+
+
+@pytest.mark.parametrize("compression", COMPRESSION_MODES)
+def test_eviction_keeps_the_remaining_snapshots_restorable(compression):
+    emulator = FakeEmulator(seed=1)
+    ring = SavestateRing(capacity=5, compression=compression, keyframe_interval=8)
+    states = play(ring, emulator, 20)
+
+    assert len(ring) == 5
+    assert ring.snapshots[0].keyframe
+    assert ring.rewind(emulator, 5) == 15
+    assert emulator.save_state_bytes() == states[15]
+
+
+def test_capture_after_rewind_starts_a_new_chain():
+    emulator = FakeEmulator(seed=2)
+    ring = SavestateRing(compression="delta")
+    states = play(ring, emulator, 6)
+
+    assert ring.rewind(emulator, 3) == 3
+    # Step numbers keep counting after a rewind: the new snapshots are steps 6 to 9
+    states = play(ring, emulator, 4)
+    assert ring.snapshots[4].keyframe
+    assert [snapshot.step for snapshot in ring.snapshots] == [0, 1, 2, 3, 6, 7, 8, 9]
+    assert ring.rewind_to_step(emulator, 8) == 8
+    assert emulator.save_state_bytes() == states[2]
+
+
+def test_rewind_errors():
+    emulator = FakeEmulator()
+    ring = SavestateRing(interval=2)
+    play(ring, emulator, 6)  # snapshots at steps 0, 2 and 4
+
+    with pytest.raises(ValueError):
+        ring.rewind(emulator, 4)
+    assert ring.rewind_to_step(emulator, 3) == 2
+    ring.snapshots.popleft()
+    with pytest.raises(ValueError):
+        ring.rewind_to_step(emulator, 0)
@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from agent.screenshot_encoder import SCAN_PALETTE_COLORS, ScreenshotEncoder, encode_frame, to_palette
+
+SHADES = np.array([[255, 255, 255], [170, 170, 170], [85, 85, 85], [0, 0, 0]], dtype=np.uint8)
+
+
+def game_boy_frame(rng, colors=SHADES, alpha=True):
+    """A (144, 160, 3|4) frame made of the given colors, RGBA like PyBoy's screen buffer."""
+    rgb = colors[rng.integers(0, len(colors), size=(144, 160))]
+    if not alpha:
+        return rgb
+    return np.concatenate([rgb, np.full((144, 160, 1), 255, dtype=np.uint8)], axis=2)
+
+
+def random_colors(rng, count):
+    return np.unique(rng.integers(0, 256, size=(count * 2, 3), dtype=np.uint8), axis=0)[:count]
+
+
+@pytest.mark.parametrize("alpha", [True, False])
+@pytest.mark.parametrize("count", [1, 4, SCAN_PALETTE_COLORS, SCAN_PALETTE_COLORS + 1, 256])
+def test_to_palette_round_trip(count, alpha):
+    rng = np.random.default_rng(count)
+    frame = game_boy_frame(rng, random_colors(rng, count), alpha)
+    indices, palette = to_palette(frame)
+    assert indices.shape == (144, 160) and indices.dtype == np.uint8
+    assert len(palette) == len(np.unique(frame[..., :3].reshape(-1, 3), axis=0))
+    np.testing.assert_array_equal(palette[indices], frame[..., :3])
+
+
+def test_to_palette_gives_up_beyond_256_colors():
+    rng = np.random.default_rng(0)
+    assert to_palette(game_boy_frame(rng, random_colors(rng, 300))) is None
+
+
+def test_to_palette_drops_alpha():
+    frame = game_boy_frame(np.random.default_rng(0))
+    frame[::2, :, 3] = 0
+    indices, palette = to_palette(frame)
+    assert palette.shape[1] == 3
+    np.testing.assert_array_equal(palette[indices], frame[..., :3])
+
+
+@pytest.mark.parametrize("upscale", [1, 2])
+@pytest.mark.parametrize("colors", [len(SHADES), 300])
+def test_encode_frame_png_is_lossless(upscale, colors):
+    rng = np.random.default_rng(colors)
+    frame = game_boy_frame(rng, SHADES if colors == len(SHADES) else random_colors(rng, colors))
+    frame.flags.writeable = False  # as returned by Emulator.get_frame
+
+    decoded = Image.open(io.BytesIO(encode_frame(frame, upscale)))
+    assert decoded.mode == ("P" if colors <= 256 else "RGB")
+    expected = frame[..., :3].repeat(upscale, axis=0).repeat(upscale, axis=1)
+    np.testing.assert_array_equal(np.asarray(decoded.convert("RGB")), expected)
+
+
+def test_encode_frame_accepts_pil_images():
+    frame = game_boy_frame(np.random.default_rng(0), alpha=False)
+    assert encode_frame(Image.fromarray(frame)) == encode_frame(frame)
+
+
+def test_encoder_reuses_identical_frames():
+    rng = np.random.default_rng(0)
+    frame = game_boy_frame(rng)
+    encoder = ScreenshotEncoder(cache_size=1)
+    url = encoder.encode(frame, 2)
+    assert url.startswith("data:image/png;base64,")
+    assert encoder.encode(frame.copy(), 2) == url
+    assert (encoder.hits, encoder.misses) == (1, 1)
+    encoder.encode(frame, 1)
+    encoder.encode(game_boy_frame(rng), 2)
+    assert encoder.misses == 3